@@ -1,20 +1,47 @@
 # app.py
 import os
-import re
 import json
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+import hashlib
+import io
+import logging
+import re
+import time
+import uuid
+from flask import Flask, Response, g, render_template, request, jsonify, session, redirect, url_for, stream_with_context
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain_core.output_parsers import StrOutputParser
-import requests  # Import the requests library
+
+# Structured, non-blocking logging; set up first since some modules log while loading
+from logging_config import configure_logging, request_id
+configure_logging()
 
 # Custom modules
-from seriousness_detector import get_seriousness_level
+from seriousness_detector import get_seriousness_level, match_seriousness_keywords
 from suggestions_manager import get_recovery_suggestions, format_suggestions
-from emergency_contacts import get_emergency_info_by_location, format_contacts_for_display
-from university_auth import authenticate_student, get_university_resources
-from voice_input import recognize_speech_from_audio
+from emergency_contacts import (
+    get_contacts_markdown,
+    get_location_listing,
+    search_emergency_contacts,
+    format_contacts_for_display,
+)
+from university_auth import authenticate_student, get_university_resources, seed_roster
+from voice_jobs import VoiceJobQueue, VoiceQueueFull
+from intent_matcher import generate_contextual_response
+from llm_client import GROQ_MODEL, LLMUnavailable, get_client as get_llm_client
+from response_cache import ResponseCache
+from pipeline import run_stages
+from conversation_memory import ConversationMemory
+from user_cache import UserCache
+from password_utils import HashingOverloaded
+import metrics
+from metrics import CHAT_FALLBACKS, CHAT_STAGE_SECONDS, HTTP_REQUEST_SECONDS, SERIOUSNESS_LEVELS
+
+logger = logging.getLogger(__name__)
+
+# Every worker writes its metrics where /metrics can merge them
+metrics.enable_export()
 
 # Load .env then .env.local (Convex CLI writes CONVEX_URL to .env.local)
 load_dotenv()
@@ -23,20 +50,28 @@ load_dotenv(".env.local")
 # User storage: Convex if CONVEX_URL is set, else SQLite (database.py)
 if os.getenv("CONVEX_URL"):
     from convex_db import (
-        get_registered_users,
-        get_user_name,
+        user_exists,
+        get_user,
         save_user,
         check_password,
         update_user,
     )
 else:
     from database import (
-        get_registered_users,
-        get_user_name,
+        init_db,
+        user_exists,
+        get_user,
         save_user,
         check_password,
         update_user,
     )
+    init_db()  # migrate the schema once at startup
+
+# Student rosters live in SQLite in both modes; seed the sample one at startup (once per database), not on first login
+seed_roster()
+
+# Profile records for page views; entries are invalidated on save/update below
+user_cache = UserCache(get_user)
 
 # Set up the Flask application
 app = Flask(__name__)
@@ -44,62 +79,129 @@ app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY') or 'dev_fallback_secret
 app.config['UPLOAD_FOLDER'] = 'uploads'
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
-# --- Helpers ---
-def contains_any_word(text: str, keywords: list[str]) -> bool:
-    """Return True if any keyword is present as a whole word in text (case-insensitive)."""
-    for kw in keywords:
-        pattern = rf"\\b{re.escape(kw)}\\b"
-        if re.search(pattern, text, flags=re.IGNORECASE):
-            return True
-    return False
-
-def contains_any_token(text: str, keywords: list[str]) -> bool:
-    """Token-based check to avoid regex edge cases; case-insensitive."""
-    tokens = set(re.findall(r"\w+", text.lower()))
-    for kw in keywords:
-        if kw.lower() in tokens:
-            return True
-    return False
-
-def generate_contextual_response(user_message: str) -> str:
-    """Keyword-based compassionate responses when LLM is unavailable."""
-    if contains_any_word(user_message, ['anxious', 'anxiety', 'worried', 'nervous']) or contains_any_token(user_message, ['anxious', 'anxiety', 'worried', 'nervous']):
-        return ("I can hear that you're feeling anxious right now, and that's completely understandable. "
-                "Would you like to try a short grounding exercise with me, or talk about what's triggering it?")
-    if contains_any_word(user_message, ['sad', 'depressed', 'down', 'lonely']) or contains_any_token(user_message, ['sad', 'depressed', 'down', 'lonely']):
-        return ("I'm so sorry you're feeling this way. Your feelings are valid. "
-                "If you'd like, tell me a bit more about what's been hardest lately.")
-    if contains_any_word(user_message, ['stressed', 'stress', 'overwhelmed']) or contains_any_token(user_message, ['stressed', 'stress', 'overwhelmed']):
-        return ("Stress can feel heavy. Let's break it down into smaller steps. "
-                "What's the one thing we can focus on for the next 15 minutes?")
-    if contains_any_word(user_message, ['angry', 'anger', 'frustrated', 'mad', 'irritated']) or contains_any_token(user_message, ['angry', 'anger', 'frustrated', 'mad', 'irritated']):
-        return ("Feeling angry is okay—it's a signal something matters to you. "
-                "Try the 4-7-8 breath (inhale 4, hold 7, exhale 8) for 4 rounds, then we can list the top 1-2 triggers together.")
-    if contains_any_word(user_message, ['calm', 'calming', 'cope', 'coping', 'relax', 'relaxation', 'strategy', 'strategies']) or contains_any_token(user_message, ['calm', 'calming', 'cope', 'coping', 'relax', 'relaxation', 'strategy', 'strategies']):
-        return ("Here are a few calming ideas: 1) 4-7-8 breathing ×4 rounds, 2) a 2-minute cold water splash on wrists, "
-                "3) write down the worry and one small next step. Which would you like to try?")
-    if contains_any_word(user_message, ['sleep', 'tired', 'insomnia', 'restless']) or contains_any_token(user_message, ['sleep', 'tired', 'insomnia', 'restless']):
-        return ("Sleep struggles are tough. A quick tip: dim lights and slow, deep breathing for 2 minutes. "
-                "Would you like a short wind-down routine?")
-    if contains_any_word(user_message, ['relationship', 'partner', 'boyfriend', 'girlfriend', 'marriage']) or contains_any_token(user_message, ['relationship', 'partner', 'boyfriend', 'girlfriend', 'marriage']):
-        return ("Relationships can be deeply tender and challenging. "
-                "Do you want to unpack what happened, or explore how you'd like to feel in this situation?")
-    if ((contains_any_word(user_message, ['periods', 'menstrual', 'cramps', 'pms']) or contains_any_token(user_message, ['periods', 'menstrual', 'cramps', 'pms'])) and
-        not contains_any_word(user_message, ['headache', 'migraine'])):
-        return ("I'm so sorry you're experiencing period pain. A heating pad and gentle stretching can help. "
-                "If pain is severe or disruptive, consider reaching out to a healthcare provider—there are treatments that help.")
-    if ((contains_any_word(user_message, ['headache', 'migraine']) or contains_any_token(user_message, ['headache', 'migraine'])) and
-        not contains_any_word(user_message, ['periods', 'menstrual'])):
-        return ("Headaches can be draining. Try resting in a dim room, hydrate, and slow breathing. "
-                "If it's severe or persistent, consider checking with a healthcare provider.")
-    if contains_any_word(user_message, ['die', 'suicide', 'kill myself', 'end it all', 'want to die']) or contains_any_token(user_message, ['die', 'suicide', 'kill', 'end', 'die']):
-        return ("I'm so sorry you're feeling this way. You matter. Please reach out for immediate help: call 988 or "
-                "text HOME to 741741. If you can, let someone nearby know how you're feeling right now.")
-    # Place greeting last and with whole-word matching to avoid matching 'hi' in 'this'
-    if contains_any_word(user_message, ['hi', 'hello', 'hey']) or contains_any_token(user_message, ['hi', 'hello', 'hey']):
-        return ("Hello! I'm so glad you're here. How are you feeling today? I'm ready to listen and support you.")
-    return ("I'm here to listen and support you. I can sense that you're going through something important. "
-            "Would you like to share a bit more so we can figure out a next small step together?")
+# --- Chat helpers ---
+# Upper bound on /api/chat time; a late LLM reply is replaced by the fallback reply
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "15"))
+
+CHAT_ERROR_RESPONSE = {
+    'ai_response': "I'm here to listen and support you. While I'm having some technical difficulties right now, please know that your feelings are valid and important. If you're in crisis, please reach out to a mental health professional or call a crisis hotline.",
+    'seriousness_level': 'Medium',
+    'suggestions': 'Consider talking to a trusted friend, family member, or mental health professional. Practice self-care activities like deep breathing, meditation, or going for a walk.'
+}
+
+def build_chat_prompt(user_message: str) -> str:
+    """Return the CalmMateAI prompt sent to the LLM for a user message."""
+    return f"""
+        You are CalmMateAI, a compassionate and empathetic mental well-being assistant. Your role is to provide supportive, personalized, and helpful responses to users who are seeking emotional support.
+
+        User's message: "{user_message}"
+
+        IMPORTANT: If the user mentions any of these specific topics, provide targeted responses:
+
+        - PERIOD PAIN/MENSTRUAL ISSUES: "I'm so sorry you're experiencing period pain. This can be incredibly difficult and debilitating. Have you tried using a heating pad, taking a warm bath, or gentle stretching? If the pain is severe or interfering with your daily activities, please consider reaching out to a healthcare provider - there are treatments that can help. You're not alone in this, and your pain is valid."
+
+        - SUICIDE/CRISIS: "I'm so sorry you're feeling this way, and I want you to know that you're not alone. These feelings are incredibly serious, and I need you to reach out for immediate help. Please call the National Suicide Prevention Lifeline at 988 or 1-800-273-8255 right now, or text HOME to 741741. You matter, and there are people who want to help you through this."
+
+        - ANXIETY: "I can hear that you're feeling anxious right now, and that's completely understandable. Anxiety can feel overwhelming, but remember that these feelings are temporary. Would you like to try some deep breathing exercises together, or would you prefer to talk more about what's causing your anxiety?"
+
+        - SADNESS/DEPRESSION: "I'm so sorry you're feeling sad and lonely. It takes courage to reach out when you're feeling this way. You're not alone in this, and your feelings are completely valid. Have you been able to talk to anyone close to you about how you're feeling?"
+
+        For all other messages, provide a warm, empathetic, and contextual response that:
+        1. Acknowledges their specific feelings and situation
+        2. Shows genuine understanding and empathy
+        3. Offers practical, supportive advice when appropriate
+        4. Encourages them to seek professional help if needed
+        5. Uses a warm, conversational tone
+        6. Avoids generic responses - be specific to their situation
+
+        Keep your response conversational and not too long (2-4 sentences). Be supportive but not overly clinical.
+        """
+
+def get_groq_api_key():
+    """Return the Groq API key, or None when it is missing or still a placeholder."""
+    api_key = os.getenv("GROQ_API_KEY") # Using Groq API key
+    if (not api_key) or ("your_groq_api_key" in api_key.lower()) or (api_key.lower().startswith("your_")):
+        return None
+    return api_key
+
+def build_chat_messages(prompt: str, context: list = ()) -> list:
+    """Return the chat-completions message list: conversation context, then the prompt."""
+    return [
+        *context,
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+def assess_message(user_message: str, seriousness_level: str = None):
+    """Return (seriousness_level, formatted suggestions) for a user message."""
+    if seriousness_level is None:
+        with CHAT_STAGE_SECONDS.time(stage="seriousness"):
+            seriousness_level = get_seriousness_level(user_message, qa_chain_for_llm_check=None)
+    SERIOUSNESS_LEVELS.inc(level=seriousness_level)
+    with CHAT_STAGE_SECONDS.time(stage="suggestions"):
+        formatted_suggestions = format_suggestions(get_recovery_suggestions(seriousness_level))
+    return seriousness_level, formatted_suggestions
+
+def build_chat_result(user_message: str, ai_response: str, seriousness_level: str = None) -> dict:
+    """Attach seriousness level and suggestions to an AI response."""
+    seriousness_level, formatted_suggestions = assess_message(user_message, seriousness_level)
+    return {
+        'ai_response': ai_response,
+        'seriousness_level': seriousness_level,
+        'suggestions': formatted_suggestions
+    }
+
+def cache_level(user_message: str) -> str:
+    """
+    Seriousness level used to gate the response cache before full scoring.
+    High and Emergency come only from the keyword rules, so the keyword pass
+    alone is enough to keep those messages out of the cache.
+    """
+    return match_seriousness_keywords(user_message)[0]
+
+# Replies for repeated messages; the key includes a fingerprint of the prompt template
+PROMPT_VERSION = hashlib.sha256(build_chat_prompt("{user_message}").encode("utf-8")).hexdigest()[:12]
+response_cache = ResponseCache(prompt_version=PROMPT_VERSION, model=GROQ_MODEL)
+
+# Multi-turn context, kept server-side per session and trimmed to a token budget
+conversation_memory = ConversationMemory()
+
+def get_conversation_id() -> str:
+    """Return this session's conversation id, creating one on first chat."""
+    if 'conversation_id' not in session:
+        session['conversation_id'] = uuid.uuid4().hex
+    return session['conversation_id']
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# --- Voice helpers ---
+VOICE_MAX_UPLOAD_BYTES = int(os.getenv("VOICE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Upload Content-Type -> container format for the decoder
+VOICE_FORMATS = {
+    'audio/wav': 'wav', 'audio/x-wav': 'wav', 'audio/wave': 'wav',
+    'audio/webm': 'webm', 'audio/ogg': 'ogg', 'audio/mpeg': 'mp3',
+    'audio/mp4': 'mp4', 'audio/x-m4a': 'mp4', 'audio/aac': 'aac', 'audio/flac': 'flac',
+}
+
+# Transcriptions run here, off the request threads
+voice_jobs = VoiceJobQueue()
+
+def read_upload(limit: int):
+    """Read the raw request body in chunks; None if it is larger than `limit` bytes."""
+    if request.content_length is not None and request.content_length > limit:
+        return None
+    buffer = io.BytesIO()
+    while True:
+        chunk = request.stream.read(64 * 1024)
+        if not chunk:
+            return buffer.getvalue()
+        buffer.write(chunk)
+        if buffer.tell() > limit:
+            return None
 
 # --- Routes for HTML pages ---
 @app.route('/')
@@ -107,6 +209,49 @@ def home():
     """Redirect to register page."""
     return redirect(url_for('register_page'))
 
+# Incoming X-Request-ID values are reused only if they look like ids
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+@app.before_request
+def start_request():
+    """Start the request timer and assign the request id used in log records."""
+    g.request_started = time.perf_counter()
+    incoming = request.headers.get('X-Request-ID', '')
+    g.request_id = incoming if REQUEST_ID_PATTERN.fullmatch(incoming) else uuid.uuid4().hex[:16]
+    request_id.set(g.request_id)
+
+@app.after_request
+def finish_request(response):
+    """Log and record per-route latency (streamed responses: until the headers are sent)."""
+    started = g.pop('request_started', None)
+    if started is not None:
+        duration = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(duration, endpoint=endpoint, method=request.method)
+        logger.info("request", extra={
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+        })
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.teardown_request
+def clear_request_id(exc):
+    request_id.set(None)
+
+@app.errorhandler(HashingOverloaded)
+@app.errorhandler(VoiceQueueFull)
+def server_busy(e):
+    """Bursts beyond the password-hashing or voice pools get a fast 503."""
+    response = jsonify({'success': False, 'message': 'The server is busy. Please try again in a moment.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
 @app.route('/login')
 def login_page():
     """Render the login page."""
@@ -120,6 +265,7 @@ def login_submit():
     password = data.get('password')
     if email and password and check_password(email, password):
         session['user_email'] = email
+        session['user_name'] = user_cache.get_name(email)
         return jsonify({'success': True, 'redirect_url': url_for('dashboard')})
     else:
         return jsonify({'success': False, 'message': 'Invalid email or password'})
@@ -139,24 +285,34 @@ def register_submit():
         password = data.get('password') or ''
         if not email or not name or not password:
             return jsonify({'success': False, 'message': 'Name, email, and password are required.'}), 400
-        users = get_registered_users()
-        if email in users:
+        if user_exists(email):
             return jsonify({'success': False, 'message': 'Email already registered'})
         save_user(email, name, password)
+        user_cache.invalidate(email)
         return jsonify({'success': True, 'message': 'Registration successful!', 'redirect_url': url_for('login_page')})
     except ValueError as e:
         return jsonify({'success': False, 'message': str(e) or 'Email already registered'})
+    except HashingOverloaded:
+        raise
     except Exception as e:
-        print(f"Registration error: {e}")
+        logger.exception("Registration failed")
         return jsonify({'success': False, 'message': f'Registration failed: {str(e)}'}), 200
 
+def current_user_name():
+    """Display name of the logged-in user, from the session when possible, else the user cache."""
+    user_name = session.get('user_name')
+    if user_name is None:
+        user_name = user_cache.get_name(session['user_email'])
+        session['user_name'] = user_name
+    return user_name
+
 @app.route('/dashboard')
 def dashboard():
     """Render the dashboard page."""
     user_email = session.get('user_email')
     if not user_email:
         return redirect(url_for('login_page'))
-    user_name = get_user_name(user_email)
+    user_name = current_user_name()
     return render_template('dashboard.html', user_name=user_name)
 
 @app.route('/chat')
@@ -165,7 +321,7 @@ def chat():
     user_email = session.get('user_email')
     if not user_email:
         return redirect(url_for('login_page'))
-    user_name = get_user_name(user_email)
+    user_name = current_user_name()
     return render_template('chat_page.html', user_name=user_name)
 
 @app.route('/emergency_contacts')
@@ -189,7 +345,7 @@ def profile():
     user_email = session.get('user_email')
     if not user_email:
         return redirect(url_for('login_page'))
-    user_name = get_user_name(user_email)
+    user_name = current_user_name()
     return render_template('profile.html', user_name=user_name, user_email=user_email)
 
 @app.route('/profile_update', methods=['POST'])
@@ -207,14 +363,17 @@ def profile_update():
         return jsonify({'success': False, 'message': 'Name is required'}), 400
     
     updated = update_user(user_email, new_name, new_password)
+    user_cache.invalidate(user_email)
     if not updated:
         return jsonify({'success': False, 'message': 'User not found'}), 404
+    session['user_name'] = new_name
     
     return jsonify({'success': True, 'message': 'Profile updated successfully'})
 
 @app.route('/logout')
 def logout():
     """Logout user and clear session."""
+    conversation_memory.forget(session.get('conversation_id'))
     session.clear()
     return redirect(url_for('register_page'))
 
@@ -224,6 +383,11 @@ def test_api():
     """Simple test endpoint to verify API is working."""
     return jsonify({'status': 'API is working', 'message': 'Hello from CalmMateAI API!'})
 
+@app.route('/metrics', methods=['GET'])
+def metrics_api():
+    """Prometheus metrics, merged across all worker processes."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/api/chat', methods=['POST'])
 def chat_api():
     """
@@ -232,101 +396,194 @@ def chat_api():
     try:
         data = request.get_json()
         user_message = data.get('message') or data.get('user_input')
-        history = data.get('history', [])
-        
-        # --- LLM Integration ---
-        # The prompt for the LLM
-        prompt = f"""
-        You are CalmMateAI, a compassionate and empathetic mental well-being assistant. Your role is to provide supportive, personalized, and helpful responses to users who are seeking emotional support.
-
-        User's message: "{user_message}"
-
-        IMPORTANT: If the user mentions any of these specific topics, provide targeted responses:
+        # Earlier turns come from server-side memory, not the request body
+        return jsonify(chat_reply(user_message, get_conversation_id()))
+    except Exception:
+        logger.exception("Error processing chat message")
+        CHAT_FALLBACKS.inc(reason='error')
+        # Return a fallback response instead of an error
+        return jsonify(CHAT_ERROR_RESPONSE), 200
 
-        - PERIOD PAIN/MENSTRUAL ISSUES: "I'm so sorry you're experiencing period pain. This can be incredibly difficult and debilitating. Have you tried using a heating pad, taking a warm bath, or gentle stretching? If the pain is severe or interfering with your daily activities, please consider reaching out to a healthcare provider - there are treatments that can help. You're not alone in this, and your pain is valid."
+def remember_exchange(conversation_id, user_message, ai_response):
+    """
+    Record one exchange in the conversation memory. A storage failure (e.g. a
+    locked or full database) is logged and otherwise ignored, so it never
+    costs the user a reply they already have.
+    """
+    try:
+        conversation_memory.record(conversation_id, user_message, ai_response)
+    except Exception:
+        logger.exception("Could not record the exchange in conversation memory")
 
-        - SUICIDE/CRISIS: "I'm so sorry you're feeling this way, and I want you to know that you're not alone. These feelings are incredibly serious, and I need you to reach out for immediate help. Please call the National Suicide Prevention Lifeline at 988 or 1-800-273-8255 right now, or text HOME to 741741. You matter, and there are people who want to help you through this."
+def chat_reply(user_message, conversation_id):
+    """
+    Reply to one chat message in a conversation: LLM (or fallback) reply and
+    seriousness assessment, run concurrently under the chat deadline.
+    Needs no request context, so voice jobs can call it from a worker thread.
 
-        - ANXIETY: "I can hear that you're feeling anxious right now, and that's completely understandable. Anxiety can feel overwhelming, but remember that these feelings are temporary. Would you like to try some deep breathing exercises together, or would you prefer to talk more about what's causing your anxiety?"
+    Returns:
+        dict: {'ai_response', 'seriousness_level', 'suggestions'}
+    """
+    context = conversation_memory.context(conversation_id)
+    
+    # --- LLM Integration ---
+    # The prompt for the LLM
+    prompt = build_chat_prompt(user_message)
 
-        - SADNESS/DEPRESSION: "I'm so sorry you're feeling sad and lonely. It takes courage to reach out when you're feeling this way. You're not alone in this, and your feelings are completely valid. Have you been able to talk to anyone close to you about how you're feeling?"
+    # Check for API key first (placeholder keys count as not configured)
+    api_key = get_groq_api_key()
 
-        For all other messages, provide a warm, empathetic, and contextual response that:
-        1. Acknowledges their specific feelings and situation
-        2. Shows genuine understanding and empathy
-        3. Offers practical, supportive advice when appropriate
-        4. Encourages them to seek professional help if needed
-        5. Uses a warm, conversational tone
-        6. Avoids generic responses - be specific to their situation
+    @CHAT_STAGE_SECONDS.time(stage="llm")
+    def llm_reply():
+        # Use contextual fallback responses when API key is not configured
+        if not api_key:
+            logger.warning("Using fallback responses - API key not configured properly")
+            CHAT_FALLBACKS.inc(reason='no_api_key')
+            return generate_contextual_response(user_message)
+        # Repeated opening messages are served from cache (never High/Emergency ones);
+        # replies that depend on earlier turns are not cached
+        level = cache_level(user_message) if not context else None
+        ai_response = response_cache.get(user_message, level) if level else None
+        if ai_response is not None:
+            return ai_response
+        # Use Groq API through the shared pooled client (timeouts, retries, circuit breaker)
+        try:
+            ai_response = get_llm_client().complete(build_chat_messages(prompt, context), api_key)
+            logger.debug("Groq reply received", extra={'reply_chars': len(ai_response)})
+            if level:
+                response_cache.put(user_message, ai_response, level)
+            return ai_response
+        except LLMUnavailable as e:
+            logger.warning("Groq API error; using fallback response: %s", e)
+            CHAT_FALLBACKS.inc(reason='llm_unavailable')
+            # Fall back to contextual responses if the API is down or the breaker is open
+            return generate_contextual_response(user_message)
+
+    # The LLM call and the seriousness assessment don't depend on each other:
+    # run them concurrently and never wait past the chat deadline. The cheap,
+    # CPU-bound assessment runs on this thread, so late LLM calls filling the
+    # pipeline pool can't hold it up.
+    results, missed = run_stages(
+        {'reply': llm_reply, 'assessment': lambda: assess_message(user_message)},
+        CHAT_DEADLINE_SECONDS,
+        inline=('assessment',),
+    )
+    if 'reply' in missed:
+        logger.warning("LLM stage missed the chat deadline; using fallback response",
+                       extra={'deadline_s': CHAT_DEADLINE_SECONDS})
+        CHAT_FALLBACKS.inc(reason='deadline')
+        ai_response = generate_contextual_response(user_message)
+    else:
+        ai_response = results['reply']
+    seriousness_level, formatted_suggestions = results.get(
+        'assessment', (CHAT_ERROR_RESPONSE['seriousness_level'], CHAT_ERROR_RESPONSE['suggestions'])
+    )
+    remember_exchange(conversation_id, user_message, ai_response)
 
-        Keep your response conversational and not too long (2-4 sentences). Be supportive but not overly clinical.
-        """
+    return {
+        'ai_response': ai_response,
+        'seriousness_level': seriousness_level,
+        'suggestions': formatted_suggestions
+    }
 
-        # Check for API key first
-        api_key = os.getenv("GROQ_API_KEY") # Using Groq API key
-        print(f"API Key loaded: {api_key[:10] if api_key else 'None'}...")  # Debug log
-        
-        # Use contextual fallback responses when API key is not configured
-        user_message_lower = user_message.lower()
-        
-        # Treat placeholder keys as not configured
-        if (not api_key) or ("your_groq_api_key" in api_key.lower()) or (api_key.lower().startswith("your_")):
-            print("Using fallback responses - API key not configured properly")
-            ai_response = generate_contextual_response(user_message)
-        else:
-            # Use Groq API
-            api_url = "https://api.groq.com/openai/v1/chat/completions"
-            
-            payload = {
-                "model": "llama-3.1-8b-instant",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "temperature": 0.7,
-                "max_tokens": 500
-            }
-            
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            try:
-                response = requests.post(api_url, headers=headers, data=json.dumps(payload))
-                response.raise_for_status() # Raise an exception for bad status codes
-                result = response.json()
-                ai_response = result['choices'][0]['message']['content']
-                print(f"Groq API Success: {ai_response[:100]}...")  # Debug log
-            except Exception as e:
-                print(f"Groq API Error: {str(e)}")  # Debug log
-                print(f"Response status: {response.status_code if 'response' in locals() else 'No response'}")
-                print(f"Response text: {response.text if 'response' in locals() else 'No response'}")
-                # Fall back to contextual responses if API call fails
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream_api():
+    """
+    Streaming variant of /api/chat using server-sent events.
+    Sends a `token` event per LLM token as Groq produces it, then a final
+    `done` event carrying the same fields as /api/chat.
+    """
+    data = request.get_json() or {}
+    user_message = data.get('message') or data.get('user_input') or ''
+    # Resolve the conversation before streaming starts so the session cookie is sent
+    conversation_id = get_conversation_id()
+    context = conversation_memory.context(conversation_id)
+
+    def generate():
+        try:
+            api_key = get_groq_api_key()
+            with CHAT_STAGE_SECONDS.time(stage="seriousness"):
+                seriousness_level = get_seriousness_level(user_message, qa_chain_for_llm_check=None)
+            tokens = []
+            cached = response_cache.get(user_message, seriousness_level) if api_key and not context else None
+            if cached is not None:
+                tokens.append(cached)
+                yield sse_event('token', {'token': cached})
+            elif api_key:
+                try:
+                    messages = build_chat_messages(build_chat_prompt(user_message), context)
+                    for token in get_llm_client().stream(messages, api_key):
+                        tokens.append(token)
+                        yield sse_event('token', {'token': token})
+                    # Only complete, context-free streams are cached
+                    if not context:
+                        response_cache.put(user_message, ''.join(tokens), seriousness_level)
+                except LLMUnavailable as e:
+                    logger.warning("Groq streaming error: %s", e, extra={'tokens_sent': len(tokens)})
+                    if not tokens:
+                        CHAT_FALLBACKS.inc(reason='llm_unavailable')
+            else:
+                logger.warning("Using fallback responses - API key not configured properly")
+                CHAT_FALLBACKS.inc(reason='no_api_key')
+
+            if tokens:
+                ai_response = ''.join(tokens)
+            else:
+                # Nothing streamed (no key or upstream failed): send the fallback as one token
                 ai_response = generate_contextual_response(user_message)
+                yield sse_event('token', {'token': ai_response})
+
+            remember_exchange(conversation_id, user_message, ai_response)
+            yield sse_event('done', build_chat_result(user_message, ai_response, seriousness_level))
+        except Exception:
+            logger.exception("Error processing streamed chat message")
+            CHAT_FALLBACKS.inc(reason='error')
+            yield sse_event('done', CHAT_ERROR_RESPONSE)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
-        # Get seriousness level and suggestions using the imported modules
-        seriousness_level = get_seriousness_level(user_message, qa_chain_for_llm_check=None)
-        suggestions_list = get_recovery_suggestions(seriousness_level)
-        formatted_suggestions = format_suggestions(suggestions_list)
-        
-        return jsonify({
-            'ai_response': ai_response,
-            'seriousness_level': seriousness_level,
-            'suggestions': formatted_suggestions
-        })
-    except Exception as e:
-        print(f"Error processing chat message: {e}")
-        import traceback
-        traceback.print_exc()
-        # Return a fallback response instead of an error
-        return jsonify({
-            'ai_response': "I'm here to listen and support you. While I'm having some technical difficulties right now, please know that your feelings are valid and important. If you're in crisis, please reach out to a mental health professional or call a crisis hotline.",
-            'seriousness_level': 'Medium',
-            'suggestions': 'Consider talking to a trusted friend, family member, or mental health professional. Practice self-care activities like deep breathing, meditation, or going for a walk.'
-        }), 200
+@app.route('/api/voice', methods=['POST'])
+def voice_upload_api():
+    """
+    Accepts a voice message as the raw request body (Content-Type audio/...)
+    and queues its transcription. With ?chat=1 the transcript is also answered
+    as a chat message in this session's conversation.
+    Returns 202 with a job id; read the result from /api/voice/<job_id>.
+    """
+    audio = read_upload(VOICE_MAX_UPLOAD_BYTES)
+    if audio is None:
+        return jsonify({'error': f'Audio is larger than {VOICE_MAX_UPLOAD_BYTES // (1024 * 1024)} MB.'}), 413
+    if not audio:
+        return jsonify({'error': 'No audio received.'}), 400
+
+    conversation_id = get_conversation_id()
+    then = None
+    if request.args.get('chat') in ('1', 'true'):
+        def then(transcript):
+            return chat_reply(transcript, conversation_id)
+    audio_format = request.args.get('format') or VOICE_FORMATS.get(request.mimetype)
+    job = voice_jobs.submit(audio, audio_format, owner=conversation_id, then=then)
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('voice_job_api', job_id=job.id),
+    }), 202
+
+@app.route('/api/voice/<job_id>', methods=['GET'])
+def voice_job_api(job_id):
+    """
+    Returns a voice job: status, then transcript (and chat reply fields) or error.
+    Answers at once from the shared job table (any worker can serve it); poll
+    every second or so until the status is 'done' or 'failed'.
+    """
+    job = voice_jobs.get(job_id, owner=session.get('conversation_id'))
+    if job is None:
+        return jsonify({'error': 'Voice job not found.'}), 404
+    return jsonify(job)
 
 @app.route('/api/contacts', methods=['POST'])
 def contacts_api():
@@ -342,30 +599,42 @@ def contacts_api():
         if not country or not city:
             return jsonify({'error': 'Country and city are required.'}), 400
         
-        # Get the contacts using the imported module
-        if category == 'all':
-            # Get all categories for the location
-            all_contacts = []
-            categories = ['helplines', 'doctors', 'domestic_violence', 'substance_abuse']
-            for cat in categories:
-                contacts = get_emergency_info_by_location(country, city, cat)
-                for contact in contacts:
-                    contact['category'] = cat
-                all_contacts.extend(contacts)
-        else:
-            all_contacts = get_emergency_info_by_location(country, city, category)
-        
-        # Format the contacts into a markdown string for display
-        formatted_contacts_markdown = format_contacts_for_display(all_contacts, f"{city}, {country}")
+        # Markdown for the location and category ("all" for every category), memoized per location
+        formatted_contacts_markdown = get_contacts_markdown(country, city, category)
         
         return jsonify({
             'contacts_markdown': formatted_contacts_markdown
         })
     
     except Exception as e:
-        print(f"Error in contacts_api: {e}")
+        logger.exception("Error in contacts_api")
         return jsonify({'error': 'Failed to retrieve contacts.', 'details': str(e)}), 500
 
+def listing_response(kind, country=None):
+    """Serve a precomputed location listing with a strong ETag (304 when the client's copy is current)."""
+    body, etag = get_location_listing(kind, country)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Cache, but revalidate every time so data updates show up immediately
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/countries', methods=['GET'])
+def countries_api():
+    """API endpoint listing all countries with emergency contacts."""
+    return listing_response('countries')
+
+@app.route('/api/cities/<path:country>', methods=['GET'])
+def cities_api(country):
+    """API endpoint listing the cities of a country (empty list if unknown)."""
+    return listing_response('cities', country)
+
+@app.route('/api/locations', methods=['GET'])
+def locations_api():
+    """API endpoint with every country and its cities, for filling both dropdowns in one request."""
+    return listing_response('locations')
+
 @app.route('/api/contacts/search', methods=['POST'])
 def contacts_search_api():
     """
@@ -383,13 +652,13 @@ def contacts_search_api():
         contacts = search_emergency_contacts(query, category)
         
         # Format the contacts into a markdown string for display
-        formatted_contacts_markdown = format_contacts_for_display(contacts, f"Search results for '{query}'")
+        formatted_contacts_markdown = format_contacts_for_display(contacts, f"Search results for '{query}'", show_location=True)
         
         return jsonify({
             'contacts_markdown': formatted_contacts_markdown
         })
     except Exception as e:
-        print(f"Error in contacts_search_api: {e}")
+        logger.exception("Error in contacts_search_api")
         return jsonify({'error': 'Failed to search contacts.', 'details': str(e)}), 500
 
 @app.route('/api/university_resources', methods=['POST'])
@@ -408,8 +677,8 @@ def university_resources_api():
             
         return jsonify({'resources': resources})
     except Exception as e:
-        print(f"Error in university_resources_api: {e}")
-        if seriousness_level == "Emergency": return jsonify({'error': 'Failed to retrieve university resources.', 'details': str(e)}), 500
+        logger.exception("Error in university_resources_api")
+        return jsonify({'error': 'Failed to retrieve university resources.', 'details': str(e)}), 500
 
 if __name__ == '__main__':
     # Get the port from the environment, defaulting to 5001
@@ -0,0 +1,268 @@
+# asgi.py
+"""
+ASGI entry point for CalmMateAI (async serving mode).
+
+The I/O-bound API routes are served on the event loop, with Groq calls made
+through the non-blocking AsyncLLMClient, so one worker can hold hundreds of
+chats in flight instead of one per gunicorn thread. Every other route is
+handed to the unchanged Flask app through asgiref's WSGI adapter.
+
+Async routes run inside a regular Flask request context, so `request`,
+`session`, before/after-request hooks and the signed session cookie behave
+exactly as they do under gunicorn.
+
+Run with:
+    uvicorn asgi:application --workers 2 --host 0.0.0.0 --port $PORT
+"""
+import asyncio
+import io
+import logging
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import Response, jsonify, request
+from werkzeug.test import EnvironBuilder
+
+import app as calmate
+from llm_client import LLMUnavailable, aclose_async_client, get_async_client
+
+flask_app = calmate.app
+logger = logging.getLogger(__name__)
+wsgi_application = WsgiToAsgi(flask_app)
+
+
+# --- Async route handlers ---
+# Each returns a Flask response value, or (response, async body iterator) to stream.
+
+async def chat_api():
+    """Async /api/chat: same request/response shape as app.chat_api."""
+    try:
+        data = request.get_json()
+        user_message = data.get('message') or data.get('user_input')
+        conversation_id = calmate.get_conversation_id()
+        # Memory, the reply cache and the assessment may touch SQLite or burn CPU: keep them off the loop
+        context = await asyncio.to_thread(calmate.conversation_memory.context, conversation_id)
+        prompt = calmate.build_chat_prompt(user_message)
+        api_key = calmate.get_groq_api_key()
+
+        async def fetch_reply():
+            if not api_key:
+                logger.warning("Using fallback responses - API key not configured properly")
+                calmate.CHAT_FALLBACKS.inc(reason='no_api_key')
+                return calmate.generate_contextual_response(user_message)
+            level = calmate.cache_level(user_message) if not context else None
+            ai_response = await asyncio.to_thread(calmate.response_cache.get, user_message, level) if level else None
+            if ai_response is not None:
+                return ai_response
+            try:
+                messages = calmate.build_chat_messages(prompt, context)
+                ai_response = await get_async_client().complete(messages, api_key)
+                logger.debug("Groq reply received", extra={'reply_chars': len(ai_response)})
+                if level:
+                    await asyncio.to_thread(calmate.response_cache.put, user_message, ai_response, level)
+                return ai_response
+            except LLMUnavailable as e:
+                logger.warning("Groq API error; using fallback response: %s", e)
+                calmate.CHAT_FALLBACKS.inc(reason='llm_unavailable')
+                return calmate.generate_contextual_response(user_message)
+
+        async def llm_reply():
+            with calmate.CHAT_STAGE_SECONDS.time(stage="llm"):
+                return await fetch_reply()
+
+        # The LLM call and the assessment (on a worker thread) run concurrently. A reply
+        # past the deadline is not awaited, but it is shielded from cancellation so the
+        # Groq call still finishes and settles the circuit breaker normally.
+        started = time.monotonic()
+        reply = asyncio.ensure_future(llm_reply())
+        reply.add_done_callback(lambda task: task.cancelled() or task.exception())
+        seriousness_level, formatted_suggestions = await asyncio.to_thread(calmate.assess_message, user_message)
+        try:
+            remaining = calmate.CHAT_DEADLINE_SECONDS - (time.monotonic() - started)
+            ai_response = await asyncio.wait_for(asyncio.shield(reply), timeout=max(0.0, remaining))
+        except asyncio.TimeoutError:
+            logger.warning("LLM stage missed the chat deadline; using fallback response",
+                           extra={'deadline_s': calmate.CHAT_DEADLINE_SECONDS})
+            calmate.CHAT_FALLBACKS.inc(reason='deadline')
+            ai_response = calmate.generate_contextual_response(user_message)
+        await asyncio.to_thread(calmate.remember_exchange, conversation_id, user_message, ai_response)
+
+        return jsonify({
+            'ai_response': ai_response,
+            'seriousness_level': seriousness_level,
+            'suggestions': formatted_suggestions
+        })
+    except Exception:
+        logger.exception("Error processing chat message")
+        calmate.CHAT_FALLBACKS.inc(reason='error')
+        return jsonify(calmate.CHAT_ERROR_RESPONSE), 200
+
+
+async def chat_stream_api():
+    """Async /api/chat/stream: same events as app.chat_stream_api."""
+    data = request.get_json() or {}
+    user_message = data.get('message') or data.get('user_input') or ''
+    conversation_id = calmate.get_conversation_id()
+    context = await asyncio.to_thread(calmate.conversation_memory.context, conversation_id)
+
+    def assess():
+        with calmate.CHAT_STAGE_SECONDS.time(stage="seriousness"):
+            return calmate.get_seriousness_level(user_message, qa_chain_for_llm_check=None)
+
+    async def generate():
+        try:
+            api_key = calmate.get_groq_api_key()
+            seriousness_level = await asyncio.to_thread(assess)
+            tokens = []
+            cached = None
+            if api_key and not context:
+                cached = await asyncio.to_thread(calmate.response_cache.get, user_message, seriousness_level)
+            if cached is not None:
+                tokens.append(cached)
+                yield calmate.sse_event('token', {'token': cached})
+            elif api_key:
+                try:
+                    messages = calmate.build_chat_messages(calmate.build_chat_prompt(user_message), context)
+                    async for token in get_async_client().stream(messages, api_key):
+                        tokens.append(token)
+                        yield calmate.sse_event('token', {'token': token})
+                    if not context:
+                        await asyncio.to_thread(calmate.response_cache.put, user_message, ''.join(tokens), seriousness_level)
+                except LLMUnavailable as e:
+                    logger.warning("Groq streaming error: %s", e, extra={'tokens_sent': len(tokens)})
+                    if not tokens:
+                        calmate.CHAT_FALLBACKS.inc(reason='llm_unavailable')
+            else:
+                logger.warning("Using fallback responses - API key not configured properly")
+                calmate.CHAT_FALLBACKS.inc(reason='no_api_key')
+
+            if tokens:
+                ai_response = ''.join(tokens)
+            else:
+                ai_response = calmate.generate_contextual_response(user_message)
+                yield calmate.sse_event('token', {'token': ai_response})
+
+            await asyncio.to_thread(calmate.remember_exchange, conversation_id, user_message, ai_response)
+            result = await asyncio.to_thread(calmate.build_chat_result, user_message, ai_response, seriousness_level)
+            yield calmate.sse_event('done', result)
+        except Exception:
+            logger.exception("Error processing streamed chat message")
+            calmate.CHAT_FALLBACKS.inc(reason='error')
+            yield calmate.sse_event('done', calmate.CHAT_ERROR_RESPONSE)
+
+    response = Response(
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+    return response, generate()
+
+
+async def contacts_api():
+    """Contacts lookups read local data; keep them off the event loop."""
+    return await asyncio.to_thread(calmate.contacts_api)
+
+
+async def university_resources_api():
+    """University lookups read JSON files from disk; keep them off the event loop."""
+    return await asyncio.to_thread(calmate.university_resources_api)
+
+
+ASYNC_ROUTES = {
+    ('POST', '/api/chat'): chat_api,
+    ('POST', '/api/chat/stream'): chat_stream_api,
+    ('POST', '/api/contacts'): contacts_api,
+    ('POST', '/api/university_resources'): university_resources_api,
+}
+
+
+# --- ASGI plumbing ---
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def _build_environ(scope, body):
+    """Build the WSGI environ Flask needs for a request context."""
+    headers = [(name.decode('latin1'), value.decode('latin1')) for name, value in scope.get('headers', [])]
+    server_name, server_port = scope.get('server') or ('localhost', None)
+    host = f"{server_name}:{server_port}" if server_port else server_name
+    environ = EnvironBuilder(
+        path=scope['path'],
+        base_url=f"{scope.get('scheme', 'http')}://{host}{scope.get('root_path', '')}",
+        method=scope['method'],
+        query_string=scope.get('query_string', b'').decode('latin1'),
+        headers=headers,
+        input_stream=io.BytesIO(body),
+        content_length=len(body),
+    ).get_environ()
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    return environ
+
+
+async def _send_response(send, response, body_iter=None):
+    if body_iter is not None:
+        response.headers.pop('Content-Length', None)
+    headers = [(key.lower().encode('latin1'), value.encode('latin1')) for key, value in response.headers.items()]
+    await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+    if body_iter is None:
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+        return
+    async for chunk in body_iter:
+        await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def _handle_async_route(handler, scope, receive, send):
+    body = await _read_body(receive)
+    if body is None:
+        return
+    with flask_app.request_context(_build_environ(scope, body)):
+        body_iter = None
+        try:
+            rv = flask_app.preprocess_request()
+            if rv is None:
+                rv = await handler()
+                if isinstance(rv, tuple) and len(rv) == 2 and isinstance(rv[0], Response) and hasattr(rv[1], '__aiter__'):
+                    rv, body_iter = rv
+            response = flask_app.make_response(rv)
+        except Exception as e:
+            # As Flask.full_dispatch_request: HTTP errors and registered handlers first, then a 500
+            try:
+                rv = flask_app.handle_user_exception(e)
+            except Exception as unhandled:
+                rv = flask_app.handle_exception(unhandled)
+            response = flask_app.make_response(rv)
+        # Runs after_request hooks and writes the session cookie, as Flask would.
+        response = flask_app.process_response(response)
+        await _send_response(send, response, body_iter)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await aclose_async_client()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI callable: async routes on the loop, everything else via Flask."""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] == 'http':
+        handler = ASYNC_ROUTES.get((scope['method'], scope['path']))
+        if handler is not None:
+            await _handle_async_route(handler, scope, receive, send)
+            return
+    await wsgi_application(scope, receive, send)
@@ -0,0 +1,96 @@
+# benchmarks/fake_groq.py
+"""
+Local stand-in for the Groq chat-completions API, for load tests.
+
+Speaks the OpenAI-compatible protocol the app uses (plain JSON and SSE
+streaming) with configurable latency, token rate and error rate, so app
+throughput can be measured without network noise, rate limits or cost.
+
+    python benchmarks/fake_groq.py --port 8765 --latency 0.3 --tokens-per-second 200 --error-rate 0.01
+
+Point the app at it with GROQ_API_URL=http://127.0.0.1:8765/openai/v1/chat/completions
+and any non-placeholder GROQ_API_KEY.
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = ("I hear you, and it makes sense that you feel this way. Let's take one small step together: "
+         "try a slow breath in for four counts and out for six. What feels most pressing right now?")
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Set from the command line in main()
+    latency = 0.3
+    tokens_per_second = 200.0
+    error_rate = 0.0
+    reply_tokens = REPLY.split(" ")
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency)  # time to first token
+        if random.random() < self.error_rate:
+            status = random.choice((429, 500, 503))
+            self._send_json(status, {"error": {"message": f"fake upstream error {status}"}})
+            return
+
+        tokens = [token if i == 0 else " " + token for i, token in enumerate(self.reply_tokens)]
+        token_delay = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        if not request.get("stream"):
+            time.sleep(token_delay * len(tokens))
+            self._send_json(200, {"choices": [{"message": {"role": "assistant", "content": "".join(tokens)}}]})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            self._write_chunk("data: " + json.dumps({"choices": [{"delta": {"content": token}}]}) + "\n\n")
+            time.sleep(token_delay)
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Groq chat-completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="0 sends all tokens at once")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 429/500/503")
+    args = parser.parse_args(argv)
+
+    FakeGroqHandler.latency = args.latency
+    FakeGroqHandler.tokens_per_second = args.tokens_per_second
+    FakeGroqHandler.error_rate = args.error_rate
+    server = ThreadingHTTPServer((args.host, args.port), FakeGroqHandler)
+    server.daemon_threads = True
+    print(f"Fake Groq listening on http://{args.host}:{args.port}/openai/v1/chat/completions", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
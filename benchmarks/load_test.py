@@ -0,0 +1,267 @@
+# benchmarks/load_test.py
+"""
+Load test for CalmMateAI against a local fake Groq server.
+
+Starts benchmarks/fake_groq.py and the app under gunicorn (with a throwaway
+SQLite database), registers a benchmark user, then has N concurrent clients
+drive a weighted mix of /api/chat, /api/contacts, /login_submit and the page
+routes for a fixed duration. Reports requests/s and p50/p95/p99 latency per
+endpoint.
+
+    python benchmarks/load_test.py --concurrency 32 --duration 30 --workers 2 --threads 8
+    python benchmarks/load_test.py --llm-latency 1.0 --error-rate 0.05 --no-response-cache
+    python benchmarks/load_test.py --url http://127.0.0.1:5000    # an app you started yourself
+
+Run it from the repository root; the same settings give comparable numbers
+between commits.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+
+CHAT_MESSAGES = [
+    "I feel stressed about my exams",
+    "I can't sleep and I'm anxious all the time",
+    "Hello, how are you?",
+    "I had a fight with my roommate and feel lonely",
+    "How can I manage my time better this week?",
+    "Everything feels overwhelming lately",
+]
+LOCATIONS = [("South Korea", "Seoul"), ("United States", "New York"), ("Canada", "Toronto")]
+
+# endpoint name -> weight in the request mix
+DEFAULT_MIX = {"chat": 4, "contacts": 2, "login": 1, "dashboard": 1, "chat_page": 1, "profile": 1}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_servers(args, workdir):
+    """Start the fake Groq server and the app; return (base_url, processes)."""
+    groq_port, app_port = _free_port(), _free_port()
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "benchmarks", "fake_groq.py"),
+        "--port", str(groq_port), "--latency", str(args.llm_latency),
+        "--tokens-per-second", str(args.tokens_per_second), "--error-rate", str(args.error_rate),
+    ])
+    env = dict(
+        os.environ,
+        GROQ_API_URL=f"http://127.0.0.1:{groq_port}/openai/v1/chat/completions",
+        GROQ_API_KEY="gsk_benchmark",
+        DATABASE_PATH=os.path.join(workdir, "bench.db"),
+        FLASK_SECRET_KEY="benchmark",
+        SERVER_THREADS=str(args.threads),  # hashing admission is sized from the thread count
+    )
+    env.pop("CONVEX_URL", None)
+    if args.no_response_cache:
+        env["RESPONSE_CACHE_SIZE"] = "0"
+    app = subprocess.Popen([
+        sys.executable, "-m", "gunicorn", "app:app",
+        "--bind", f"127.0.0.1:{app_port}", "--workers", str(args.workers), "--threads", str(args.threads),
+        "--log-level", "warning",
+    ], cwd=ROOT, env=env, stdout=subprocess.DEVNULL if args.quiet else None)
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        _wait_for(f"http://127.0.0.1:{groq_port}/")
+        _wait_for(base_url + "/api/test")
+    except RuntimeError:
+        stop_servers([fake, app])
+        raise
+    return base_url, [fake, app]
+
+
+def stop_servers(processes):
+    for proc in processes:
+        proc.terminate()
+    for proc in processes:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def logged_in_session(base_url):
+    """A requests.Session logged in as the benchmark user (registered on first use)."""
+    client = requests.Session()
+    client.post(base_url + "/register_submit",
+                json={"email": BENCH_EMAIL, "name": "Bench User", "password": BENCH_PASSWORD}, timeout=30)
+    response = client.post(base_url + "/login_submit",
+                           json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD}, timeout=30)
+    if not response.json().get("success"):
+        raise RuntimeError(f"could not log in as {BENCH_EMAIL}: {response.text}")
+    return client
+
+
+def make_request(client, base_url, endpoint):
+    """Issue one request for `endpoint`; return True if it succeeded."""
+    if endpoint == "chat":
+        response = client.post(base_url + "/api/chat", json={"message": random.choice(CHAT_MESSAGES)}, timeout=60)
+        return response.ok and "ai_response" in response.json()
+    if endpoint == "contacts":
+        country, city = random.choice(LOCATIONS)
+        response = client.post(base_url + "/api/contacts",
+                               json={"country": country, "city": city, "category": "all"}, timeout=30)
+        return response.ok
+    if endpoint == "login":
+        response = client.post(base_url + "/login_submit",
+                               json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD}, timeout=30)
+        return response.ok and response.json().get("success")
+    path = {"dashboard": "/dashboard", "chat_page": "/chat", "profile": "/profile"}[endpoint]
+    response = client.get(base_url + path, allow_redirects=False, timeout=30)
+    return response.status_code == 200
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def run_load(base_url, concurrency, duration, mix, warmup=2.0):
+    """
+    Drive the request mix from `concurrency` clients for `duration` seconds.
+
+    Returns:
+        dict: endpoint -> {"latencies": [seconds], "errors": int}, plus the measured wall time.
+    """
+    endpoints = list(mix)
+    weights = [mix[name] for name in endpoints]
+    results = defaultdict(lambda: {"latencies": [], "errors": 0})
+    lock = threading.Lock()
+    start = time.monotonic() + warmup
+    stop = start + duration
+
+    def client_loop():
+        client = logged_in_session(base_url)
+        while True:
+            endpoint = random.choices(endpoints, weights)[0]
+            began = time.monotonic()
+            if began >= stop:
+                return
+            try:
+                ok = make_request(client, base_url, endpoint)
+            except (requests.RequestException, ValueError):
+                ok = False
+            elapsed = time.monotonic() - began
+            if began < start:
+                continue  # warm-up requests aren't counted
+            with lock:
+                entry = results[endpoint]
+                entry["latencies"].append(elapsed)
+                if not ok:
+                    entry["errors"] += 1
+
+    # Register once up front so the clients don't race on it
+    logged_in_session(base_url).close()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(client_loop) for _ in range(concurrency)]:
+            future.result()
+    return dict(results), duration
+
+
+def report(results, wall_time):
+    """Print a per-endpoint table and return it as a list of dicts."""
+    rows = []
+    for endpoint in sorted(results):
+        latencies = sorted(results[endpoint]["latencies"])
+        rows.append({
+            "endpoint": endpoint,
+            "requests": len(latencies),
+            "errors": results[endpoint]["errors"],
+            "rps": len(latencies) / wall_time,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        })
+    total = sum(row["requests"] for row in rows)
+    print(f"\n{'endpoint':<12}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in rows:
+        print(f"{row['endpoint']:<12}{row['requests']:>10}{row['errors']:>8}{row['rps']:>9.1f}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+    print(f"{'total':<12}{total:>10}{sum(row['errors'] for row in rows):>8}{total / wall_time:>9.1f}")
+    return rows
+
+
+def parse_mix(text):
+    """Parse "chat=4,contacts=2" into a mix dict."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown endpoint '{name}' (use {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test CalmMateAI against a fake Groq server.")
+    parser.add_argument("--url", help="test an already running app instead of starting one")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds first")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="weighted endpoints, e.g. chat=4,contacts=2,login=1,dashboard=1")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake Groq time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="fake Groq token rate")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake Groq error fraction")
+    parser.add_argument("--no-response-cache", action="store_true", help="start the app with RESPONSE_CACHE_SIZE=0")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the request mix")
+    parser.add_argument("--quiet", action="store_true", help="hide the app's stdout")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        processes = []
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            base_url, processes = start_servers(args, workdir)
+        try:
+            print(f"Load testing {base_url}: {args.concurrency} clients for {args.duration:.0f}s")
+            results, wall_time = run_load(base_url, args.concurrency, args.duration, args.mix, args.warmup)
+        finally:
+            stop_servers(processes)
+    rows = report(results, wall_time)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": {k: v for k, v in vars(args).items() if k != "json"}, "results": rows}, f, indent=2)
+    return 0 if rows else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# benchmarks/microbench.py
+"""
+Microbenchmarks for the CPU-bound helpers on the chat and login paths.
+
+    python benchmarks/microbench.py
+    python benchmarks/microbench.py --repeat 7 seriousness hash_password
+
+Each benchmark is timed with timeit (best of --repeat runs, auto-ranged loop
+count) and reported as time per call, so numbers can be compared between
+commits on the same machine.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emergency_contacts import get_emergency_info_by_location  # noqa: E402
+from intent_matcher import generate_contextual_response  # noqa: E402
+from password_utils import hash_password  # noqa: E402
+from seriousness_detector import get_seriousness_level  # noqa: E402
+
+MESSAGES = [
+    "I feel stressed about my exams",
+    "I can't sleep and I'm anxious all the time",
+    "Hello, how are you?",
+    "I don't want to live anymore",
+    "Everything feels overwhelming lately and I don't know who to talk to about it",
+]
+
+
+def _cycle(fn, items):
+    """Call fn on the next item each time, so one input doesn't dominate."""
+    state = {"i": 0}
+
+    def call():
+        item = items[state["i"] % len(items)]
+        state["i"] += 1
+        return fn(*item) if isinstance(item, tuple) else fn(item)
+    return call
+
+
+BENCHMARKS = {
+    "seriousness": _cycle(get_seriousness_level, MESSAGES),
+    "contextual_response": _cycle(generate_contextual_response, MESSAGES),
+    "emergency_info": _cycle(get_emergency_info_by_location, [
+        ("South Korea", "Seoul", "all"), ("united states", "new york", "helplines"), ("Canada", "Toronto", "doctors"),
+    ]),
+    "hash_password": _cycle(hash_password, ["correct horse battery staple", "hunter2"]),
+}
+
+
+def run(name, repeat=5):
+    """Return the best seconds per call for one benchmark."""
+    timer = timeit.Timer(BENCHMARKS[name])
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CalmMateAI microbenchmarks.")
+    parser.add_argument("names", nargs="*", help=f"any of {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per benchmark")
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    for name in args.names or BENCHMARKS:
+        per_call = run(name, args.repeat)
+        print(f"{name:<22}{per_call * 1e6:>12.1f} us/call{1 / per_call:>12.0f} calls/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
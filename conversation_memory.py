@@ -0,0 +1,154 @@
+# conversation_memory.py
+"""
+Server-side, per-session chat memory for CalmMateAI.
+
+Each conversation keeps a short ring buffer of recent turns that always fits
+a token budget. Turns pushed out of the buffer are folded into a compact
+running summary instead of being resent, so the prompt sent to Groq stays
+roughly the same size however long the conversation gets.
+
+Memory is bounded per user (turn count, characters per turn, summary size)
+and overall (number of conversations, idle expiry). Conversations are stored
+as JSON in the SQLite database rather than in the worker process, so every
+gunicorn worker sees the same history whichever one serves the next message.
+
+Because these are mental-health conversations, they are not kept as
+transcripts: once a conversation has been idle for MEMORY_IDLE_TTL seconds it
+is no longer read and is deleted from disk by the next chat request after
+that (checked at most every MEMORY_PRUNE_SECONDS per worker), and logging out
+deletes it at once.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from database import delete_conversation, get_conversation, prune_conversations, update_conversation
+
+MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "5000"))
+MEMORY_IDLE_TTL = float(os.getenv("MEMORY_IDLE_TTL", "3600"))
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "12"))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "600"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "150"))
+MEMORY_MAX_TURN_CHARS = 2000
+# Each worker deletes expired and surplus conversations at most this often (seconds).
+MEMORY_PRUNE_SECONDS = 60
+# Each summarized user turn keeps at most this much of its first sentence.
+SUMMARY_POINT_CHARS = 160
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English)."""
+    return max(1, len(text) // 4)
+
+
+def _summary_point(text: str) -> str:
+    """First sentence of a message, shortened, as one summary bullet."""
+    first = _SENTENCE_END.split(text.strip(), maxsplit=1)[0]
+    if len(first) > SUMMARY_POINT_CHARS:
+        first = first[:SUMMARY_POINT_CHARS].rsplit(" ", 1)[0] + "…"
+    return first
+
+
+class Conversation:
+    """Recent turns within the token budget plus a running summary of older ones."""
+
+    def __init__(self):
+        self.turns = deque()  # (role, content, tokens)
+        self.turn_tokens = 0
+        self.summary_points = deque()
+        self.summary_tokens = 0
+
+    @classmethod
+    def from_json(cls, state: str):
+        conversation = cls()
+        data = json.loads(state)
+        conversation.turns.extend(tuple(turn) for turn in data["turns"])
+        conversation.turn_tokens = sum(turn[2] for turn in conversation.turns)
+        conversation.summary_points.extend(data["summary"])
+        conversation.summary_tokens = sum(estimate_tokens(point) for point in conversation.summary_points)
+        return conversation
+
+    def to_json(self) -> str:
+        return json.dumps({"turns": list(self.turns), "summary": list(self.summary_points)})
+
+    def _fold_oldest(self):
+        """Move the oldest turn out of the buffer and into the summary."""
+        role, content, tokens = self.turns.popleft()
+        self.turn_tokens -= tokens
+        # Only the user's side is summarized; our own replies add little context.
+        if role != "user":
+            return
+        point = _summary_point(content)
+        self.summary_points.append(point)
+        self.summary_tokens += estimate_tokens(point)
+        while self.summary_tokens > MEMORY_SUMMARY_TOKENS and len(self.summary_points) > 1:
+            self.summary_tokens -= estimate_tokens(self.summary_points.popleft())
+
+    def add(self, role: str, content: str):
+        content = (content or "")[:MEMORY_MAX_TURN_CHARS]
+        tokens = estimate_tokens(content)
+        self.turns.append((role, content, tokens))
+        self.turn_tokens += tokens
+        # Keep the newest turn even if it alone exceeds the budget.
+        while len(self.turns) > 1 and (len(self.turns) > MEMORY_MAX_TURNS or self.turn_tokens > MEMORY_TOKEN_BUDGET):
+            self._fold_oldest()
+
+    def messages(self) -> list:
+        """Chat-completions messages for this conversation's context."""
+        messages = []
+        if self.summary_points:
+            messages.append({
+                "role": "system",
+                "content": "Earlier in this conversation the user said: " + " | ".join(self.summary_points),
+            })
+        messages.extend({"role": role, "content": content} for role, content, _ in self.turns)
+        return messages
+
+
+class ConversationMemory:
+    """Conversations by id in the shared database, bounded in count and expired when idle."""
+
+    def __init__(self, max_sessions=MEMORY_MAX_SESSIONS, idle_ttl=MEMORY_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+
+    def _prune_if_due(self):
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_prune:
+                return
+            self._next_prune = now + MEMORY_PRUNE_SECONDS
+        prune_conversations(self.idle_ttl, self.max_sessions)
+
+    def context(self, conversation_id) -> list:
+        """Return the context messages to send before the new user message ([] if none)."""
+        if not conversation_id:
+            return []
+        self._prune_if_due()
+        state = get_conversation(conversation_id, self.idle_ttl)
+        return Conversation.from_json(state).messages() if state else []
+
+    def record(self, conversation_id, user_message: str, ai_response: str):
+        """Append one user/assistant exchange and refresh the idle timer."""
+        if not conversation_id:
+            return
+
+        def update(state):
+            conversation = Conversation.from_json(state) if state else Conversation()
+            conversation.add("user", user_message)
+            conversation.add("assistant", ai_response)
+            return conversation.to_json()
+
+        update_conversation(conversation_id, update, self.idle_ttl)
+        self._prune_if_due()
+
+    def forget(self, conversation_id):
+        if conversation_id:
+            delete_conversation(conversation_id)
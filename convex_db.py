@@ -5,7 +5,9 @@ Uses the same interface as database.py so app.py can switch via CONVEX_URL.
 Requires: pip install convex python-dotenv, and a Convex project (convex/ + npx convex dev).
 """
 import os
-from password_utils import hash_password, check_password as verify_password
+
+from metrics import DB_QUERY_SECONDS
+from password_utils import HashingOverloaded, hash_password, needs_rehash, check_password as verify_password
 
 # Optional: use Convex only when CONVEX_URL is set
 _convex_client = None
@@ -32,16 +34,34 @@ def get_registered_users():
     """
     Return all users as { email: { 'name': str, 'password': str } }.
     Passwords in Convex are stored hashed; this returns the hash for check_password.
+    Reads every user: use get_user / user_exists for single lookups.
     """
     client = _get_client()
-    rows = client.query("users:list")
+    with DB_QUERY_SECONDS.time(operation="get_registered_users"):
+        rows = client.query("users:list")
     return {r["email"]: {"name": r["name"], "password": r["password"]} for r in (rows or [])}
 
 
+def get_user(email):
+    """Return { 'email': str, 'name': str, 'password': str } for one user, or None."""
+    client = _get_client()
+    with DB_QUERY_SECONDS.time(operation="get_user"):
+        user = client.query("users:getByEmail", {"email": email})
+    if not user:
+        return None
+    return {"email": user["email"], "name": user["name"], "password": user["password"]}
+
+
+def user_exists(email):
+    """Return True if a user is registered with this email."""
+    return get_user(email) is not None
+
+
 def get_user_name(email):
     """Return display name for email, or 'User' if not found."""
     client = _get_client()
-    user = client.query("users:getByEmail", {"email": email})
+    with DB_QUERY_SECONDS.time(operation="get_user_name"):
+        user = client.query("users:getByEmail", {"email": email})
     return user["name"] if user else "User"
 
 
@@ -50,11 +70,12 @@ def save_user(email, name, password):
     password_hash = hash_password(password)
     client = _get_client()
     try:
-        client.mutation("users:create", {
-            "email": email,
-            "name": name,
-            "password": password_hash,
-        })
+        with DB_QUERY_SECONDS.time(operation="save_user"):
+            client.mutation("users:create", {
+                "email": email,
+                "name": name,
+                "password": password_hash,
+            })
     except Exception as e:
         if "already registered" in str(e).lower() or "unique" in str(e).lower():
             raise ValueError("Email already registered") from e
@@ -62,11 +83,25 @@ def save_user(email, name, password):
 
 
 def check_password(email, password):
-    """Return True if the given password matches the stored hash for this email."""
-    users = get_registered_users()
-    if email not in users:
+    """
+    Return True if the given password matches the stored hash for this email.
+    A hash made with old settings is transparently replaced on successful login.
+    """
+    user = get_user(email)
+    if user is None or not verify_password(user["password"], password):
         return False
-    return verify_password(users[email]["password"], password)
+    if needs_rehash(user["password"]):
+        try:
+            password_hash = hash_password(password)
+        except HashingOverloaded:
+            return True  # upgrade on a later login
+        with DB_QUERY_SECONDS.time(operation="rehash_password"):
+            _get_client().mutation("users:update", {
+                "email": email,
+                "newName": user["name"],
+                "newPassword": password_hash,
+            })
+    return True
 
 
 def update_user(email, new_name, new_password=None):
@@ -78,5 +113,6 @@ def update_user(email, new_name, new_password=None):
     args = {"email": email, "newName": new_name}
     if new_password is not None:
         args["newPassword"] = hash_password(new_password)
-    result = client.mutation("users:update", args)
+    with DB_QUERY_SECONDS.time(operation="update_user"):
+        result = client.mutation("users:update", args)
     return result is not None
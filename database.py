@@ -2,90 +2,209 @@
 """
 SQLite database for user storage.
 Uses hashed passwords; compatible with existing app routes.
+
+Each thread keeps one open connection (re-opened after a fork), in WAL mode
+so readers don't block behind a writer. The schema is migrated once per
+process, on the first connection, rather than on every call.
 """
 import os
 import sqlite3
-from password_utils import hash_password, check_password as verify_password
+import threading
+import time
 
-# Database file path (in project root)
-DB_PATH = os.path.join(os.path.dirname(__file__), "calmateai.db")
+from metrics import DB_QUERY_SECONDS
+from password_utils import HashingOverloaded, hash_password, needs_rehash, check_password as verify_password
 
+# Database file path (in project root unless DATABASE_PATH is set)
+DB_PATH = os.getenv("DATABASE_PATH") or os.path.join(os.path.dirname(__file__), "calmateai.db")
 
-def get_connection():
-    """Return a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
+# Seconds a writer waits for the lock before "database is locked" is raised.
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "5"))
+
+# Applied to every new connection.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",   # safe with WAL; fsync at checkpoints only
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",     # ~8 MB page cache per connection
+    "PRAGMA secure_delete=ON",     # expired chat memory and transcripts are overwritten, not left in free pages
+)
+
+# Schema migrations in order; PRAGMA user_version records how many have run.
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        password TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # University rosters; `university` holds the normalized name (see university_auth.roster_key)
+    """
+    CREATE TABLE IF NOT EXISTS student_roster (
+        university TEXT NOT NULL,
+        student_id TEXT NOT NULL,
+        email TEXT,
+        password TEXT NOT NULL,
+        PRIMARY KEY (university, student_id)
+    ) WITHOUT ROWID
+    """,
+    # Chat memory shared by all workers (see conversation_memory.py); `state` is JSON
+    """
+    CREATE TABLE IF NOT EXISTS conversations (
+        id TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)",
+    # Voice transcription jobs (see voice_jobs.py), readable from every worker; `result` is JSON
+    """
+    CREATE TABLE IF NOT EXISTS voice_jobs (
+        id TEXT PRIMARY KEY,
+        owner TEXT,
+        status TEXT NOT NULL,
+        result TEXT NOT NULL DEFAULT '{}',
+        error TEXT,
+        created_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS voice_jobs_created_at ON voice_jobs (created_at)",
+    # At most one row: the process that claimed seeding the sample roster (see university_auth.seed_roster)
+    """
+    CREATE TABLE IF NOT EXISTS roster_seed (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        pid INTEGER NOT NULL,
+        claimed_at REAL NOT NULL
+    )
+    """,
+]
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_pid = None
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row  # access columns by name
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection():
+    """Return this thread's connection to the SQLite database (schema already migrated)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        # A connection must not be shared across a fork, so each worker opens its own.
+        conn = _connect()
+        _local.conn = conn
+        _local.pid = os.getpid()
+    if _schema_pid != os.getpid():
+        init_db()
     return conn
 
 
 def init_db():
-    """Create the users table if it doesn't exist."""
-    conn = get_connection()
-    try:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                password TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        conn.commit()
-    finally:
-        conn.close()
+    """Apply any pending schema migrations. Runs once per process; later calls are no-ops."""
+    global _schema_pid
+    with _schema_lock:
+        if _schema_pid == os.getpid():
+            return
+        conn = _connect()
+        try:
+            # IMMEDIATE takes the write lock up front so concurrent workers migrate one at a time.
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for statement in MIGRATIONS[version:]:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+            conn.commit()
+        finally:
+            conn.close()
+        _schema_pid = os.getpid()
 
 
+@DB_QUERY_SECONDS.time(operation="get_registered_users")
 def get_registered_users():
     """
     Return all users as a dict: { email: { 'name': str, 'password': str } }.
     Keeps the same shape as the old users.json for compatibility.
     Passwords in DB are hashed; this returns the hash (only for checking via check_password).
+    Reads the whole table: use get_user / user_exists for single lookups.
     """
-    init_db()
-    conn = get_connection()
-    try:
-        rows = conn.execute("SELECT email, name, password FROM users").fetchall()
-        return {row["email"]: {"name": row["name"], "password": row["password"]} for row in rows}
-    finally:
-        conn.close()
+    rows = get_connection().execute("SELECT email, name, password FROM users").fetchall()
+    return {row["email"]: {"name": row["name"], "password": row["password"]} for row in rows}
 
 
+@DB_QUERY_SECONDS.time(operation="get_user")
+def get_user(email):
+    """
+    Return { 'email': str, 'name': str, 'password': str } for one user, or None.
+    Looks the email up through the table's UNIQUE index.
+    """
+    row = get_connection().execute(
+        "SELECT email, name, password FROM users WHERE email = ?", (email,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+@DB_QUERY_SECONDS.time(operation="user_exists")
+def user_exists(email):
+    """Return True if a user is registered with this email."""
+    row = get_connection().execute("SELECT 1 FROM users WHERE email = ? LIMIT 1", (email,)).fetchone()
+    return row is not None
+
+
+@DB_QUERY_SECONDS.time(operation="get_user_name")
 def get_user_name(email):
     """Return display name for email, or 'User' if not found."""
-    init_db()
-    conn = get_connection()
-    try:
-        row = conn.execute("SELECT name FROM users WHERE email = ?", (email,)).fetchone()
-        return row["name"] if row else "User"
-    finally:
-        conn.close()
+    row = get_connection().execute("SELECT name FROM users WHERE email = ?", (email,)).fetchone()
+    return row["name"] if row else "User"
 
 
 def save_user(email, name, password):
     """
     Register a new user. Password is hashed before storing.
-    Raises if email already exists (caller should check first).
+    Raises ValueError if the email is already registered.
     """
-    init_db()
     password_hash = hash_password(password)
     conn = get_connection()
     try:
-        conn.execute(
-            "INSERT INTO users (email, name, password) VALUES (?, ?, ?)",
-            (email, name, password_hash),
-        )
-        conn.commit()
-    finally:
-        conn.close()
+        with DB_QUERY_SECONDS.time(operation="save_user"), conn:
+            conn.execute(
+                "INSERT INTO users (email, name, password) VALUES (?, ?, ?)",
+                (email, name, password_hash),
+            )
+    except sqlite3.IntegrityError as e:
+        raise ValueError("Email already registered") from e
 
 
 def check_password(email, password):
-    """Return True if the given password matches the stored hash for this email."""
-    users = get_registered_users()
-    if email not in users:
+    """
+    Return True if the given password matches the stored hash for this email.
+    A hash made with old settings is transparently replaced on successful login.
+    """
+    user = get_user(email)
+    if user is None or not verify_password(user["password"], password):
         return False
-    return verify_password(users[email]["password"], password)
+    if needs_rehash(user["password"]):
+        try:
+            password_hash = hash_password(password)
+        except HashingOverloaded:
+            return True  # upgrade on a later login
+        conn = get_connection()
+        with DB_QUERY_SECONDS.time(operation="rehash_password"), conn:
+            # Only if the password wasn't changed meanwhile
+            conn.execute(
+                "UPDATE users SET password = ? WHERE email = ? AND password = ?",
+                (password_hash, email, user["password"]),
+            )
+    return True
 
 
 def update_user(email, new_name, new_password=None):
@@ -93,18 +212,181 @@ def update_user(email, new_name, new_password=None):
     Update name and optionally password for the given email.
     Returns True if a row was updated.
     """
-    init_db()
+    # Hash before taking the write lock; it is the slow part.
+    password_hash = hash_password(new_password) if new_password else None
     conn = get_connection()
-    try:
-        if new_password:
-            password_hash = hash_password(new_password)
-            conn.execute(
+    with DB_QUERY_SECONDS.time(operation="update_user"), conn:
+        if password_hash:
+            cursor = conn.execute(
                 "UPDATE users SET name = ?, password = ? WHERE email = ?",
                 (new_name, password_hash, email),
             )
         else:
-            conn.execute("UPDATE users SET name = ? WHERE email = ?", (new_name, email))
+            cursor = conn.execute("UPDATE users SET name = ? WHERE email = ?", (new_name, email))
+    return cursor.rowcount > 0
+
+
+@DB_QUERY_SECONDS.time(operation="get_student_password")
+def get_student_password(university, student_id):
+    """Return the stored password hash for a student, or None if not on the roster."""
+    row = get_connection().execute(
+        "SELECT password FROM student_roster WHERE university = ? AND student_id = ?",
+        (university, student_id),
+    ).fetchone()
+    return row["password"] if row else None
+
+
+@DB_QUERY_SECONDS.time(operation="roster_has_university")
+def roster_has_university(university):
+    """Return True if any student of this university is on the roster."""
+    row = get_connection().execute(
+        "SELECT 1 FROM student_roster WHERE university = ? LIMIT 1", (university,)
+    ).fetchone()
+    return row is not None
+
+
+@DB_QUERY_SECONDS.time(operation="roster_is_empty")
+def roster_is_empty():
+    """Return True if no rosters have been imported yet."""
+    return get_connection().execute("SELECT 1 FROM student_roster LIMIT 1").fetchone() is None
+
+
+@DB_QUERY_SECONDS.time(operation="claim_roster_seed")
+def claim_roster_seed():
+    """
+    Return True if this process should seed the roster: it is empty and no
+    other process has claimed seeding it. Only ever True once per database.
+    """
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        claimed = False
+        if conn.execute("SELECT 1 FROM student_roster LIMIT 1").fetchone() is None:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO roster_seed (id, pid, claimed_at) VALUES (1, ?, ?)",
+                (os.getpid(), time.time()),
+            )
+            claimed = cursor.rowcount == 1
         conn.commit()
-        return conn.total_changes > 0
-    finally:
-        conn.close()
+        return claimed
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+@DB_QUERY_SECONDS.time(operation="save_students")
+def save_students(rows):
+    """
+    Insert or replace roster entries in one transaction.
+    
+    Args:
+        rows (iterable): (university, student_id, email, password_hash) tuples.
+        
+    Returns:
+        int: Number of rows written.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.executemany(
+            """
+            INSERT INTO student_roster (university, student_id, email, password) VALUES (?, ?, ?, ?)
+            ON CONFLICT (university, student_id) DO UPDATE SET email = excluded.email, password = excluded.password
+            """,
+            rows,
+        )
+    return cursor.rowcount
+
+
+@DB_QUERY_SECONDS.time(operation="get_conversation")
+def get_conversation(conversation_id, max_idle):
+    """Return a conversation's stored state (JSON text), or None if missing or idle for over max_idle seconds."""
+    row = get_connection().execute(
+        "SELECT state FROM conversations WHERE id = ? AND updated_at > ?",
+        (conversation_id, time.time() - max_idle),
+    ).fetchone()
+    return row["state"] if row else None
+
+
+@DB_QUERY_SECONDS.time(operation="update_conversation")
+def update_conversation(conversation_id, update, max_idle):
+    """
+    Read-modify-write one conversation under the database write lock, so
+    workers recording turns for the same session at once don't lose any.
+
+    Args:
+        conversation_id (str): The conversation.
+        update (callable): fn(state or None) -> new state (JSON text); an idle
+            conversation is passed as None.
+        max_idle (float): Seconds after which a stored conversation counts as expired.
+    """
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT state, updated_at FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        now = time.time()
+        state = row["state"] if row and row["updated_at"] > now - max_idle else None
+        conn.execute(
+            """
+            INSERT INTO conversations (id, state, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+            """,
+            (conversation_id, update(state), now),
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+@DB_QUERY_SECONDS.time(operation="delete_conversation")
+def delete_conversation(conversation_id):
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+
+@DB_QUERY_SECONDS.time(operation="prune_conversations")
+def prune_conversations(max_idle, max_rows):
+    """Drop conversations idle for over max_idle seconds, then all but the max_rows most recent."""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM conversations WHERE updated_at <= ?", (time.time() - max_idle,))
+        conn.execute(
+            "DELETE FROM conversations WHERE id NOT IN ("
+            " SELECT id FROM conversations ORDER BY updated_at DESC LIMIT ?)",
+            (max_rows,),
+        )
+
+
+@DB_QUERY_SECONDS.time(operation="save_voice_job")
+def save_voice_job(job_id, owner, status, result, error, created_at):
+    """Insert or update one voice job (`result` is JSON text)."""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO voice_jobs (id, owner, status, result, error, created_at) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET status = excluded.status, result = excluded.result, error = excluded.error
+            """,
+            (job_id, owner, status, result, error, created_at),
+        )
+
+
+@DB_QUERY_SECONDS.time(operation="get_voice_job")
+def get_voice_job(job_id, max_age):
+    """Return { 'owner', 'status', 'result', 'error' } for a job created in the last max_age seconds, or None."""
+    row = get_connection().execute(
+        "SELECT owner, status, result, error FROM voice_jobs WHERE id = ? AND created_at > ?",
+        (job_id, time.time() - max_age),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+@DB_QUERY_SECONDS.time(operation="prune_voice_jobs")
+def prune_voice_jobs(max_age):
+    """Delete voice jobs (and their transcripts) created over max_age seconds ago."""
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM voice_jobs WHERE created_at <= ?", (time.time() - max_age,))
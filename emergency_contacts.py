@@ -1,83 +1,435 @@
 # emergency_contacts.py
 
+import bisect
+import hashlib
 import json
+import logging
 import os
+import threading
+import time
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+from text_utils import normalize_name
+
+logger = logging.getLogger(__name__)
 
 # Define the path to the data file
 DATA_FILE = os.path.join(os.path.dirname(__file__), 'emergency_data.json')
+# How often each worker checks the data file for changes (0 disables hot reload)
+DATA_POLL_SECONDS = float(os.getenv("EMERGENCY_DATA_POLL_SECONDS", "5"))
+
+# Categories in the order /api/contacts lists them for "all".
+CONTACT_CATEGORIES = ('helplines', 'doctors', 'domestic_violence', 'substance_abuse')
+
+
+class Contact(NamedTuple):
+    """One contact, immutable so every request can share the loaded records."""
+    name: str
+    number: str
+    url: Optional[str]
+    category: str
+    country: str
+    city: str
+
+
+# Common alternative names, keyed by normalized alias.
+COUNTRY_ALIASES = {
+    'korea': 'South Korea',
+    's korea': 'South Korea',
+    'republic of korea': 'South Korea',
+    'usa': 'United States',
+    'us': 'United States',
+    'u s a': 'United States',
+    'u s': 'United States',
+    'america': 'United States',
+    'united states of america': 'United States',
+    'uk': 'United Kingdom',
+    'u k': 'United Kingdom',
+    'great britain': 'United Kingdom',
+    'britain': 'United Kingdom',
+    'england': 'United Kingdom',
+    'holland': 'Netherlands',
+    'the netherlands': 'Netherlands',
+    'czechia': 'Czech Republic',
+    'turkiye': 'Turkey',
+    'cote divoire': 'Ivory Coast',
+    'drc': 'Democratic Republic of Congo',
+    'dr congo': 'Democratic Republic of Congo',
+    'congo kinshasa': 'Democratic Republic of Congo',
+    'congo brazzaville': 'Republic of Congo',
+    'eswatini': 'Swaziland',
+    'cabo verde': 'Cape Verde',
+}
+
+# Alternative city names per country, keyed by normalized alias.
+CITY_ALIASES = {
+    'United States': {'nyc': 'New York', 'new york city': 'New York', 'la': 'Los Angeles'},
+    'India': {'bombay': 'Mumbai', 'new delhi': 'Delhi'},
+    'South Africa': {'joburg': 'Johannesburg'},
+    'Mexico': {'cdmx': 'Mexico City'},
+}
+
+
+# Search field weights: a hit in a contact's name counts most.
+SEARCH_FIELD_WEIGHTS = {'name': 3.0, 'city': 2.0, 'country': 2.0, 'category': 1.0}
+# Score multipliers by how a query word matched an indexed word.
+EXACT_MATCH, PREFIX_MATCH, TYPO_MATCH = 1.0, 0.7, 0.4
+# Words shorter than this aren't typo-corrected (too many false hits).
+TYPO_MIN_LENGTH = 4
+SEARCH_STOPWORDS = frozenset({'a', 'an', 'and', 'at', 'for', 'in', 'near', 'of', 'the', 'to'})
+SEARCH_LIMIT = 20
+
+
+def _deletes(word):
+    """The word plus every variant with one character removed (SymSpell-style typo keys)."""
+    return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class ContactSearchIndex:
+    """
+    Inverted index over every contact: word -> {entry id: field weight}.
+    Query words match indexed words exactly, as a prefix (sorted vocabulary
+    + bisect, for search-as-you-type) or within one edit (precomputed
+    single-deletion keys); every query word must match for an entry to count.
+    """
+
+    def __init__(self, records):
+        self.entries = []
+        self.postings = defaultdict(dict)
+        for cities in records.values():
+            for city_info in cities.values():
+                for contacts in city_info.values():
+                    for contact in contacts:
+                        entry_id = len(self.entries)
+                        self.entries.append(contact)
+                        fields = {'name': contact.name, 'city': contact.city,
+                                  'country': contact.country, 'category': contact.category}
+                        for field, text in fields.items():
+                            weight = SEARCH_FIELD_WEIGHTS[field]
+                            for word in normalize_name(text).split():
+                                if weight > self.postings[word].get(entry_id, 0.0):
+                                    self.postings[word][entry_id] = weight
+        self.postings = dict(self.postings)
+        self.vocabulary = sorted(self.postings)
+        self.typo_keys = defaultdict(set)
+        for word in self.vocabulary:
+            if len(word) >= TYPO_MIN_LENGTH - 1:
+                for key in _deletes(word):
+                    self.typo_keys[key].add(word)
+        self.typo_keys = dict(self.typo_keys)
+
+    def _word_matches(self, word):
+        """Return {indexed word: match multiplier} for one query word."""
+        matches = {}
+        # Prefix range in the sorted vocabulary (includes the exact word); every
+        # word starting with `word` sorts before `word` + the highest code point
+        start = bisect.bisect_left(self.vocabulary, word)
+        end = bisect.bisect_left(self.vocabulary, word + "\U0010ffff", start)
+        for indexed in self.vocabulary[start:end]:
+            matches[indexed] = EXACT_MATCH if indexed == word else PREFIX_MATCH
+        if not matches and len(word) >= TYPO_MIN_LENGTH:
+            for key in _deletes(word):
+                for indexed in self.typo_keys.get(key, ()):
+                    matches.setdefault(indexed, TYPO_MATCH)
+        return matches
+
+    def search(self, query, category=None, limit=SEARCH_LIMIT):
+        """Return up to `limit` matching contacts, best first."""
+        words = [w for w in normalize_name(query).split() if w not in SEARCH_STOPWORDS]
+        if not words:
+            return []
+        scores = None
+        for word in words:
+            word_scores = {}
+            for indexed, multiplier in self._word_matches(word).items():
+                for entry_id, weight in self.postings[indexed].items():
+                    score = weight * multiplier
+                    if score > word_scores.get(entry_id, 0.0):
+                        word_scores[entry_id] = score
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {entry_id: scores[entry_id] + score
+                          for entry_id, score in word_scores.items() if entry_id in scores}
+            if not scores:
+                return []
+        if category and category != 'all':
+            scores = {entry_id: score for entry_id, score in scores.items()
+                      if self.entries[entry_id].category == category}
+        ranked = sorted(scores, key=lambda entry_id: (-scores[entry_id], entry_id))
+        return [self.entries[entry_id] for entry_id in ranked[:limit]]
+
+
+def _listing(payload):
+    """Encode a listing payload and derive its strong ETag from the bytes."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return body, hashlib.sha256(body).hexdigest()[:32]
+
+
+class LocationIndex:
+    """
+    Lookup structures built once from one version of the data. Treated as
+    read-only after construction, so requests can share it without locking.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        # normalized country name or alias -> canonical country
+        self.countries = {}
+        # (canonical country, normalized city name or alias) -> canonical city
+        self.cities = {}
+        for country, cities in records.items():
+            self.countries[normalize_name(country)] = country
+            for city in cities:
+                self.cities[(country, normalize_name(city))] = city
+        for alias, country in COUNTRY_ALIASES.items():
+            if country in records:
+                self.countries.setdefault(alias, country)
+        for country, aliases in CITY_ALIASES.items():
+            for alias, city in aliases.items():
+                if city in records.get(country, {}):
+                    self.cities.setdefault((country, alias), city)
+        self.search = ContactSearchIndex(records)
+        # Markdown per (country, city, category), rendered on first request
+        self.rendered = {}
+        # Listing payloads for the location endpoints, encoded once: key -> (JSON bytes, ETag)
+        locations = {country: sorted(records[country]) for country in sorted(records)}
+        self.listings = {'countries': _listing(list(locations)), 'locations': _listing(locations)}
+        for country, cities in locations.items():
+            self.listings[('cities', country)] = _listing(cities)
+        self.listings[('cities', None)] = _listing([])
+
+    def resolve(self, country, city):
+        """Return the canonical (country, city) for any spelling/alias, or None if unknown."""
+        canonical = self.countries.get(normalize_name(country))
+        if canonical is None:
+            return None
+        canonical_city = self.cities.get((canonical, normalize_name(city)))
+        if canonical_city is None:
+            return None
+        return canonical, canonical_city
+
+    def contacts(self, country, city, category):
+        """Contacts for a canonical location; category "all" joins every category in order."""
+        city_info = self.records[country][city]
+        if category == 'all':
+            return tuple(contact for cat in CONTACT_CATEGORIES for contact in city_info.get(cat, ()))
+        return city_info.get(category, ())
+
+    def render(self, country, city, category):
+        """Markdown for a canonical location, memoized (keys are bounded by the data)."""
+        key = (country, city, category)
+        markdown = self.rendered.get(key)
+        if markdown is None:
+            markdown = format_contacts_for_display(self.contacts(country, city, category), f"{city}, {country}")
+            self.rendered[key] = markdown
+        return markdown
+
+
+def build_records(data):
+    """
+    Convert parsed emergency_data.json into {country: {city: {category: (Contact, ...)}}}.
+    Raises ValueError if the structure isn't as expected.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("top level must be an object of countries")
+    records = {}
+    for country, cities in data.items():
+        if not isinstance(cities, dict):
+            raise ValueError(f"{country}: expected an object of cities")
+        records[country] = {}
+        for city, city_info in cities.items():
+            if not isinstance(city_info, dict):
+                raise ValueError(f"{country}/{city}: expected an object of categories")
+            records[country][city] = {}
+            for category, contacts in city_info.items():
+                if not isinstance(contacts, list):
+                    raise ValueError(f"{country}/{city}/{category}: expected a list of contacts")
+                entries = []
+                for contact in contacts:
+                    if not isinstance(contact, dict) or not contact.get('name'):
+                        raise ValueError(f"{country}/{city}/{category}: every contact needs a name")
+                    name, number, url = contact['name'], contact.get('number', 'N/A'), contact.get('url')
+                    if not isinstance(name, str) or not isinstance(number, str) or not isinstance(url, (str, type(None))):
+                        raise ValueError(f"{country}/{city}/{category}/{name}: name, number and url must be strings")
+                    entries.append(Contact(
+                        name=name,
+                        number=number,
+                        url=url,
+                        category=category,
+                        country=country,
+                        city=city,
+                    ))
+                records[country][city][category] = tuple(entries)
+    return records
+
+
+def load_data(path=DATA_FILE):
+    """Read the data file and return its records with their index."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        logger.error("The data file '%s' was not found.", path)
+        data = {}
+    records = build_records(data)
+    return records, LocationIndex(records)
+
+
+def _file_signature(path):
+    """(mtime, size) of the data file, or None if it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
 
 # Load the data once when the module is imported
-try:
-    with open(DATA_FILE, 'r') as f:
-        EMERGENCY_DATA = json.load(f)
-except FileNotFoundError:
-    print(f"Error: The data file '{DATA_FILE}' was not found.")
-    EMERGENCY_DATA = {}
+_data_signature = _file_signature(DATA_FILE)
+EMERGENCY_DATA, _index = load_data()
+_watcher_pid = None
+_watcher_lock = threading.Lock()
+
+
+def reload_data(path=DATA_FILE):
+    """
+    Re-read the data file and swap in the new records and index if it is valid.
+    The index is built completely before the swap, so requests see either the
+    old data or the new, never a mix; a missing, unparsable, malformed or
+    empty file is rejected and the current data kept.
+    
+    Returns:
+        bool: True if new data was loaded.
+    """
+    global EMERGENCY_DATA, _index, _data_signature
+    signature = _file_signature(path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            records = build_records(json.load(f))
+        if not records:
+            raise ValueError("no countries")
+        index = LocationIndex(records)
+    except (OSError, ValueError) as e:
+        logger.error("Keeping current emergency data; '%s' was rejected: %s", path, e)
+        _data_signature = signature  # don't retry until the file changes again
+        return False
+    _index = index
+    EMERGENCY_DATA = records
+    _data_signature = signature
+    logger.info("Reloaded emergency data: %d countries", len(records))
+    return True
+
+
+def _watch(path, interval):
+    global _data_signature
+    while True:
+        time.sleep(interval)
+        try:
+            if _file_signature(path) != _data_signature:
+                reload_data(path)
+        except Exception:
+            # Never let a bad file end hot reload for the life of the worker
+            logger.exception("Keeping current emergency data; reloading '%s' failed", path)
+            _data_signature = _file_signature(path)
+
+
+def _current():
+    """The current index, starting this process's file watcher on first use (after any fork)."""
+    global _watcher_pid
+    if DATA_POLL_SECONDS > 0 and _watcher_pid != os.getpid():
+        with _watcher_lock:
+            if _watcher_pid != os.getpid():
+                threading.Thread(
+                    target=_watch, args=(DATA_FILE, DATA_POLL_SECONDS),
+                    name="emergency-data-watcher", daemon=True,
+                ).start()
+                _watcher_pid = os.getpid()
+    return _index
 
 def get_available_countries():
     """Returns a list of all countries available in the data."""
-    return sorted(list(EMERGENCY_DATA.keys()))
+    return sorted(_current().records)
 
 def get_cities_for_country(country_name):
     """Returns a list of cities for a given country."""
-    if country_name in EMERGENCY_DATA:
-        return sorted(list(EMERGENCY_DATA[country_name].keys()))
+    records = _current().records
+    if country_name in records:
+        return sorted(records[country_name])
     return []
 
+def get_location_listing(kind, country=None):
+    """
+    Returns the precomputed JSON listing for the location endpoints.
+    
+    Args:
+        kind (str): "countries" (sorted names), "cities" (sorted cities of
+            `country`, any spelling/alias; [] if unknown) or "locations"
+            ({country: [cities]} for all countries).
+        country (str): The country, for kind "cities".
+        
+    Returns:
+        tuple: (JSON body bytes, strong ETag string)
+    """
+    index = _current()
+    if kind == 'cities':
+        return index.listings[('cities', index.countries.get(normalize_name(country)))]
+    return index.listings[kind]
+
 def get_emergency_info_by_location(country, city, category):
     """
     Retrieves emergency contact information for a specific country, city, and category.
-    Performs case-insensitive matching for country and city names.
+    Country and city match regardless of case, accents, punctuation and common
+    aliases ("usa", "NYC", "Sao Paulo"), with one index lookup.
     
     Args:
         country (str): The country name.
         city (str): The city name.
-        category (str): The category ("helplines" or "doctors").
+        category (str): The category ("helplines", "doctors", ... or "all").
         
     Returns:
-        list: A list of dictionaries containing contact info. Returns an empty list if not found.
-    """
-    # Common country name variations
-    country_variations = {
-        'korea': 'South Korea',
-        'south korea': 'South Korea',
-        's. korea': 'South Korea',
-        'usa': 'United States',
-        'u.s.a': 'United States',
-        'us': 'United States',
-        'united states': 'United States',
-        'uk': 'United Kingdom',
-        'u.k.': 'United Kingdom',
-        'united kingdom': 'United Kingdom',
-        'canada': 'Canada',
-    }
-    
-    # Normalize country name
-    country_lower = country.lower().strip()
-    country_normalized = country_variations.get(country_lower, country).title().strip()
-    city_normalized = city.title().strip()
-    
-    # Try exact match first
-    country_data = EMERGENCY_DATA.get(country_normalized, {})
-    city_data = country_data.get(city_normalized, {})
-    
-    # If no exact match, try case-insensitive search
-    if not city_data:
-        for data_country, cities in EMERGENCY_DATA.items():
-            if data_country.lower() == country_normalized.lower():
-                for data_city, city_info in cities.items():
-                    if data_city.lower() == city.lower():
-                        return city_info.get(category, [])
+        tuple: Contact records (shared; don't modify). Empty if not found.
+    """
+    index = _current()
+    location = index.resolve(country, city)
+    if location is None:
+        return ()
+    return index.contacts(*location, category)
+
+def get_contacts_markdown(country, city, category):
+    """
+    Returns the Markdown listing for a location and category ("all" for every
+    category). Known locations are rendered once and then served from memory.
+    """
+    index = _current()
+    location = index.resolve(country, city)
+    if location is None or category not in (*CONTACT_CATEGORIES, 'all'):
+        return format_contacts_for_display((), f"{city}, {country}")
+    return index.render(*location, category)
+
+def search_emergency_contacts(query, category=None):
+    """
+    Searches contacts across all locations by contact name, city, country and category.
+    Tolerates partial words and single-letter typos ("helpl toront", "sydeny").
     
-    return city_data.get(category, [])
+    Args:
+        query (str): Free-text search.
+        category (str): Optional category filter ("helplines", "doctors" or "all").
+        
+    Returns:
+        list: Matching Contact records, best match first.
+    """
+    return _current().search.search(query, category)
 
-def format_contacts_for_display(contacts, location):
+def format_contacts_for_display(contacts, location, show_location=False):
     """
-    Formats a list of contact dictionaries into a Markdown string for display.
+    Formats Contact records into a Markdown string for display.
     
     Args:
-        contacts (list): A list of contact dictionaries.
+        contacts (iterable): Contact records.
         location (str): A string representing the location (e.g., "Seoul, South Korea").
+        show_location (bool): List each contact's city and country (for search results).
         
     Returns:
         str: A Markdown-formatted string.
@@ -85,20 +437,18 @@ def format_contacts_for_display(contacts, location):
     if not contacts:
         return f"No information found for {location}."
     
-    formatted_text = f"### Emergency Contacts for {location}\n\n"
+    parts = [f"### Emergency Contacts for {location}\n\n"]
     for contact in contacts:
-        name = contact.get('name', 'N/A')
-        number = contact.get('number', 'N/A')
-        url = contact.get('url', None)
-        
-        formatted_text += f"**{name}**\n"
-        if number != 'N/A':
-            formatted_text += f"- Phone: `{number}`\n"
-        if url:
-            formatted_text += f"- Website: <{url}>\n"
-        formatted_text += "\n"
+        parts.append(f"**{contact.name}**\n")
+        if show_location:
+            parts.append(f"- Location: {contact.city}, {contact.country}\n")
+        if contact.number != 'N/A':
+            parts.append(f"- Phone: `{contact.number}`\n")
+        if contact.url:
+            parts.append(f"- Website: <{contact.url}>\n")
+        parts.append("\n")
         
-    return formatted_text
+    return ''.join(parts)
 
 # You'll also need the emergency_data.json file.
 
@@ -0,0 +1,22 @@
+# gunicorn.conf.py
+"""
+Gunicorn server hooks for CalmMateAI (gunicorn loads this file from the
+working directory automatically; workers, threads and bind stay on the
+command line, see the Procfile).
+
+Keeps METRICS_DIR to one metrics file per live worker: it is emptied when
+the server starts, and an exited worker's file is folded into the archive
+file so /metrics totals never go backwards.
+"""
+import metrics
+
+
+def on_starting(server):
+    metrics.reset()
+
+
+def child_exit(server, worker):
+    try:
+        metrics.mark_process_dead(worker.pid)
+    except OSError as e:
+        server.log.warning("Could not archive metrics of worker %s: %s", worker.pid, e)
@@ -0,0 +1,120 @@
+# intent_matcher.py
+"""
+Keyword intents for the compassionate fallback replies used when the LLM is
+unavailable (no API key, upstream errors, circuit breaker open).
+
+All rule keywords are compiled once at import into a single case-insensitive
+whole-word alternation, so one scan of a message finds every matched keyword;
+rules are then checked in priority order against that set.
+"""
+import re
+
+# Rules in priority order: the first rule with a matching keyword (and none of
+# its `unless` keywords) provides the reply.
+RULES = [
+    {
+        "intent": "anxiety",
+        "keywords": ["anxious", "anxiety", "worried", "nervous"],
+        "response": ("I can hear that you're feeling anxious right now, and that's completely understandable. "
+                     "Would you like to try a short grounding exercise with me, or talk about what's triggering it?"),
+    },
+    {
+        "intent": "sadness",
+        "keywords": ["sad", "depressed", "down", "lonely"],
+        "response": ("I'm so sorry you're feeling this way. Your feelings are valid. "
+                     "If you'd like, tell me a bit more about what's been hardest lately."),
+    },
+    {
+        "intent": "stress",
+        "keywords": ["stressed", "stress", "overwhelmed"],
+        "response": ("Stress can feel heavy. Let's break it down into smaller steps. "
+                     "What's the one thing we can focus on for the next 15 minutes?"),
+    },
+    {
+        "intent": "anger",
+        "keywords": ["angry", "anger", "frustrated", "mad", "irritated"],
+        "response": ("Feeling angry is okay—it's a signal something matters to you. "
+                     "Try the 4-7-8 breath (inhale 4, hold 7, exhale 8) for 4 rounds, then we can list the top 1-2 triggers together."),
+    },
+    {
+        "intent": "coping",
+        "keywords": ["calm", "calming", "cope", "coping", "relax", "relaxation", "strategy", "strategies"],
+        "response": ("Here are a few calming ideas: 1) 4-7-8 breathing ×4 rounds, 2) a 2-minute cold water splash on wrists, "
+                     "3) write down the worry and one small next step. Which would you like to try?"),
+    },
+    {
+        "intent": "sleep",
+        "keywords": ["sleep", "tired", "insomnia", "restless"],
+        "response": ("Sleep struggles are tough. A quick tip: dim lights and slow, deep breathing for 2 minutes. "
+                     "Would you like a short wind-down routine?"),
+    },
+    {
+        "intent": "relationship",
+        "keywords": ["relationship", "partner", "boyfriend", "girlfriend", "marriage"],
+        "response": ("Relationships can be deeply tender and challenging. "
+                     "Do you want to unpack what happened, or explore how you'd like to feel in this situation?"),
+    },
+    {
+        "intent": "period_pain",
+        "keywords": ["periods", "menstrual", "cramps", "pms"],
+        "unless": ["headache", "migraine"],
+        "response": ("I'm so sorry you're experiencing period pain. A heating pad and gentle stretching can help. "
+                     "If pain is severe or disruptive, consider reaching out to a healthcare provider—there are treatments that help."),
+    },
+    {
+        "intent": "headache",
+        "keywords": ["headache", "migraine"],
+        "unless": ["periods", "menstrual"],
+        "response": ("Headaches can be draining. Try resting in a dim room, hydrate, and slow breathing. "
+                     "If it's severe or persistent, consider checking with a healthcare provider."),
+    },
+    {
+        "intent": "crisis",
+        "keywords": ["die", "suicide", "kill myself", "end it all", "want to die", "kill", "end"],
+        "response": ("I'm so sorry you're feeling this way. You matter. Please reach out for immediate help: call 988 or "
+                     "text HOME to 741741. If you can, let someone nearby know how you're feeling right now."),
+    },
+    # Greeting last, whole-word only, so 'hi' in 'this' doesn't count
+    {
+        "intent": "greeting",
+        "keywords": ["hi", "hello", "hey"],
+        "response": "Hello! I'm so glad you're here. How are you feeling today? I'm ready to listen and support you.",
+    },
+]
+
+DEFAULT_RESPONSE = ("I'm here to listen and support you. I can sense that you're going through something important. "
+                    "Would you like to share a bit more so we can figure out a next small step together?")
+
+# Compiled once: (intent, keywords, unless, response) with frozensets for the set checks.
+_COMPILED_RULES = [
+    (rule["intent"], frozenset(rule["keywords"]), frozenset(rule.get("unless", ())), rule["response"])
+    for rule in RULES
+]
+_ALL_KEYWORDS = {kw for _, keywords, unless, _ in _COMPILED_RULES for kw in keywords | unless}
+# Longest first so multi-word phrases win over their own first word.
+KEYWORD_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(kw) for kw in sorted(_ALL_KEYWORDS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE,
+)
+
+
+def match_keywords(text: str) -> set:
+    """Return every rule keyword found in text as a whole word (lowercased), in one scan."""
+    return {m.group(0).lower() for m in KEYWORD_PATTERN.finditer(text or "")}
+
+
+def match_intents(text: str) -> list:
+    """Return all matched intents in priority order."""
+    found = match_keywords(text)
+    return [intent for intent, keywords, unless, _ in _COMPILED_RULES
+            if found & keywords and not found & unless]
+
+
+def generate_contextual_response(user_message: str) -> str:
+    """Keyword-based compassionate responses when LLM is unavailable."""
+    found = match_keywords(user_message)
+    if found:
+        for _, keywords, unless, response in _COMPILED_RULES:
+            if found & keywords and not found & unless:
+                return response
+    return DEFAULT_RESPONSE
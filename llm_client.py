@@ -0,0 +1,432 @@
+# llm_client.py
+"""
+Shared Groq chat-completions client for CalmMateAI.
+
+One client per worker process keeps a pooled keep-alive requests.Session,
+applies separate connect/read timeouts, retries transient failures with
+bounded jittered backoff, and trips a circuit breaker when Groq keeps failing
+so callers can go straight to their fallback instead of waiting on it.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LLM_ATTEMPTS, LLM_REQUEST_SECONDS
+
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+
+# Per-phase timeouts (seconds): TCP/TLS connect, then each socket read.
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "20"))
+# Retries are only attempted while the whole call stays within this budget.
+TOTAL_TIMEOUT = float(os.getenv("LLM_TOTAL_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+BACKOFF_BASE = 0.25
+BACKOFF_MAX = 2.0
+# Keep-alive connections per worker; matches the gunicorn --threads setting.
+POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "8"))
+# In-flight Groq calls per worker in ASGI mode (see asgi.py).
+ASYNC_MAX_CONNECTIONS = int(os.getenv("LLM_ASYNC_MAX_CONNECTIONS", "500"))
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    """Raised when the LLM cannot produce a response (breaker open or call failed)."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open breaker.
+    After `failure_threshold` consecutive failures the breaker opens and rejects
+    calls for `reset_seconds`; then a single trial call is let through and its
+    outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow_request(self):
+        """Return True if a call may be attempted now."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+def _retry_delay(attempt, started):
+    """
+    Return the full-jitter backoff before the next attempt, or None when the
+    retry count or the total time budget is used up.
+    """
+    if attempt >= MAX_RETRIES:
+        return None
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    if time.monotonic() - started + delay >= TOTAL_TIMEOUT:
+        return None
+    return delay
+
+
+def _attempt_timeouts(started):
+    """
+    (connect, read) timeouts for the next attempt, clamped to what is left of
+    TOTAL_TIMEOUT so a slow final attempt can't overrun it; None once it is spent.
+    """
+    remaining = TOTAL_TIMEOUT - (time.monotonic() - started)
+    if remaining <= 0:
+        return None
+    return min(CONNECT_TIMEOUT, remaining), min(READ_TIMEOUT, remaining)
+
+
+def _parse_stream_line(line):
+    """
+    Parse one line of Groq's OpenAI-style event stream.
+    Returns the token text ('' for keep-alives and empty deltas), or None at `data: [DONE]`.
+    """
+    if not line or not line.startswith("data:"):
+        return ""
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
+    chunk = json.loads(data)
+    return chunk["choices"][0].get("delta", {}).get("content") or ""
+
+
+def _settle(breaker, started, stream, succeeded):
+    """
+    Record a finished Groq call with the breaker (any non-success is a failure)
+    and its time until the response headers (for streams, before any token).
+    """
+    if succeeded:
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+    LLM_REQUEST_SECONDS.observe(
+        time.monotonic() - started, mode="stream" if stream else "complete", outcome="ok" if succeeded else "error"
+    )
+
+
+def _error_result(error, timeout_type, connection_type):
+    """Label for a failed attempt in calmate_llm_attempts_total."""
+    if isinstance(error, timeout_type):
+        return "timeout"
+    if isinstance(error, connection_type):
+        return "connection_error"
+    return "error"
+
+
+def _headers(api_key):
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+
+
+def _payload(model, messages, temperature, max_tokens, stream):
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+class LLMClient:
+    """Pooled Groq client for WSGI threads; use get_client() for the per-worker instance."""
+
+    def __init__(self, api_url=GROQ_API_URL, model=GROQ_MODEL, breaker=None):
+        self.api_url = api_url
+        self.model = model
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        # Retries are handled here (with jitter and a total budget), not by urllib3.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _post(self, api_key, payload, stream=False):
+        """
+        POST with bounded, jittered retries. Returns a successful response.
+        Raises LLMUnavailable when the breaker is open or every attempt failed.
+        """
+        if not self.breaker.allow_request():
+            LLM_ATTEMPTS.inc(result="breaker_open")
+            raise LLMUnavailable("circuit breaker open")
+
+        headers = _headers(api_key)
+        started = time.monotonic()
+        last_error = None
+        succeeded = False
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                timeouts = _attempt_timeouts(started)
+                if timeouts is None:
+                    break
+                try:
+                    response = self.session.post(
+                        self.api_url,
+                        headers=headers,
+                        data=json.dumps(payload),
+                        timeout=timeouts,
+                        stream=stream,
+                    )
+                    LLM_ATTEMPTS.inc(result=response.status_code)
+                    if response.status_code < 400:
+                        succeeded = True
+                        return response
+                    last_error = requests.HTTPError(
+                        f"{response.status_code} from Groq: {response.text[:200]}", response=response
+                    )
+                    response.close()
+                    if response.status_code not in RETRYABLE_STATUS:
+                        break
+                except requests.RequestException as e:
+                    LLM_ATTEMPTS.inc(result=_error_result(e, requests.Timeout, requests.ConnectionError))
+                    last_error = e
+
+                delay = _retry_delay(attempt, started)
+                if delay is None:
+                    break
+                time.sleep(delay)
+            raise LLMUnavailable(str(last_error)) from last_error
+        finally:
+            # Whatever ends the call (including unexpected errors) settles the breaker,
+            # so a half-open trial can't stay in flight forever.
+            _settle(self.breaker, started, stream, succeeded)
+
+    def complete(self, messages, api_key, temperature=0.7, max_tokens=500):
+        """Return the full completion text for `messages`."""
+        response = self._post(api_key, _payload(self.model, messages, temperature, max_tokens, stream=False))
+        try:
+            result = response.json()
+            content = result["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            self.breaker.record_failure()
+            raise LLMUnavailable(f"malformed Groq response: {e}") from e
+        return content
+
+    def stream(self, messages, api_key, temperature=0.7, max_tokens=500):
+        """
+        Yield completion tokens as Groq produces them.
+        Failures before the first token are retried; a failure mid-stream
+        raises LLMUnavailable after the tokens already yielded.
+        """
+        response = self._post(api_key, _payload(self.model, messages, temperature, max_tokens, stream=True), stream=True)
+        try:
+            with response:
+                done = False
+                # Read to the end of the body even after [DONE], so the connection goes back to the pool
+                for line in response.iter_lines(decode_unicode=True):
+                    if done:
+                        continue
+                    token = _parse_stream_line(line)
+                    if token is None:
+                        done = True
+                    elif token:
+                        yield token
+        except (requests.RequestException, ValueError, KeyError, IndexError) as e:
+            self.breaker.record_failure()
+            raise LLMUnavailable(f"Groq stream interrupted: {e}") from e
+
+
+class AsyncLLMClient:
+    """
+    Non-blocking Groq client for the ASGI app; use get_async_client().
+    Same timeouts, retry policy and breaker semantics as LLMClient, on httpx.
+    """
+
+    def __init__(self, api_url=GROQ_API_URL, model=GROQ_MODEL, breaker=None):
+        import httpx  # only needed in ASGI mode
+
+        self._httpx = httpx
+        self.api_url = api_url
+        self.model = model
+        self.breaker = breaker or CircuitBreaker()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_MAX_CONNECTIONS,
+            ),
+        )
+
+    async def _post(self, api_key, payload, stream=False):
+        """Async counterpart of LLMClient._post; the caller closes the response."""
+        if not self.breaker.allow_request():
+            LLM_ATTEMPTS.inc(result="breaker_open")
+            raise LLMUnavailable("circuit breaker open")
+
+        headers = _headers(api_key)
+        content = json.dumps(payload)
+        started = time.monotonic()
+        last_error = None
+        succeeded = False
+        try:
+            for attempt in range(MAX_RETRIES + 1):
+                timeouts = _attempt_timeouts(started)
+                if timeouts is None:
+                    break
+                connect_timeout, read_timeout = timeouts
+                request = self.client.build_request(
+                    "POST", self.api_url, headers=headers, content=content,
+                    timeout=self._httpx.Timeout(read_timeout, connect=connect_timeout),
+                )
+                try:
+                    response = await self.client.send(request, stream=stream)
+                    LLM_ATTEMPTS.inc(result=response.status_code)
+                    if response.status_code < 400:
+                        succeeded = True
+                        return response
+                    await response.aread()
+                    last_error = self._httpx.HTTPStatusError(
+                        f"{response.status_code} from Groq: {response.text[:200]}",
+                        request=request,
+                        response=response,
+                    )
+                    await response.aclose()
+                    if response.status_code not in RETRYABLE_STATUS:
+                        break
+                except self._httpx.HTTPError as e:
+                    httpx = self._httpx
+                    LLM_ATTEMPTS.inc(result=_error_result(e, httpx.TimeoutException, httpx.TransportError))
+                    last_error = e
+
+                delay = _retry_delay(attempt, started)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+            raise LLMUnavailable(str(last_error)) from last_error
+        finally:
+            # Also runs on cancellation (e.g. a chat deadline), which must not wedge a half-open trial.
+            _settle(self.breaker, started, stream, succeeded)
+
+    async def complete(self, messages, api_key, temperature=0.7, max_tokens=500):
+        """Return the full completion text for `messages`."""
+        response = await self._post(api_key, _payload(self.model, messages, temperature, max_tokens, stream=False))
+        try:
+            result = response.json()
+            return result["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            self.breaker.record_failure()
+            raise LLMUnavailable(f"malformed Groq response: {e}") from e
+
+    async def stream(self, messages, api_key, temperature=0.7, max_tokens=500):
+        """Async generator of completion tokens; see LLMClient.stream."""
+        response = await self._post(
+            api_key, _payload(self.model, messages, temperature, max_tokens, stream=True), stream=True
+        )
+        try:
+            done = False
+            # Drain the body after [DONE] too, so the connection is kept alive for reuse
+            async for line in response.aiter_lines():
+                if done:
+                    continue
+                token = _parse_stream_line(line)
+                if token is None:
+                    done = True
+                elif token:
+                    yield token
+        except (self._httpx.HTTPError, ValueError, KeyError, IndexError) as e:
+            self.breaker.record_failure()
+            raise LLMUnavailable(f"Groq stream interrupted: {e}") from e
+        finally:
+            await response.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# One breaker per worker process, shared by the sync and async clients.
+_breaker = None
+_client = None
+_async_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """Drop clients inherited from a parent process; callers hold _client_lock."""
+    global _breaker, _client, _async_client, _client_pid
+    pid = os.getpid()
+    if _client_pid != pid:
+        _breaker = CircuitBreaker()
+        _client = None
+        _async_client = None
+        _client_pid = pid
+
+
+def get_client():
+    """Return this worker process's shared LLMClient (re-created after fork)."""
+    global _client
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            _reset_after_fork()
+            if _client is None:
+                _client = LLMClient(breaker=_breaker)
+    return _client
+
+
+def get_async_client():
+    """Return this worker process's shared AsyncLLMClient; call from the event loop."""
+    global _async_client
+    if _async_client is None or _client_pid != os.getpid():
+        with _client_lock:
+            _reset_after_fork()
+            if _async_client is None:
+                _async_client = AsyncLLMClient(breaker=_breaker)
+    return _async_client
+
+
+async def aclose_async_client():
+    """Close the async client's connection pool (ASGI lifespan shutdown)."""
+    global _async_client
+    client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,208 @@
+# logging_config.py
+"""
+Non-blocking structured logging for CalmMateAI.
+
+Request threads only put records on a bounded in-memory queue; a listener
+thread per worker process formats them as one JSON object per line and
+writes them to stdout, so a slow or contended stdout never adds latency to a
+request. If the queue is full, records are dropped (and counted) rather than
+waited on.
+
+Every record carries the current request id, set by app.py per request and
+copied into pipeline stages and voice jobs with contextvars. Secrets (Groq
+keys, bearer tokens, the configured API key and session secret) are redacted
+before anything is written.
+
+    LOG_LEVEL        DEBUG / INFO (default) / WARNING / ERROR
+    LOG_FORMAT       json (default) or text
+    LOG_SAMPLE_RATE  fraction of requests whose DEBUG/INFO records are kept (default 1);
+                     warnings and errors are always kept
+    LOG_QUEUE_SIZE   records buffered before new ones are dropped (default 10000)
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Id of the request being handled, or None outside requests
+request_id = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+SECRET_PATTERNS = (
+    re.compile(r"gsk_[A-Za-z0-9]{8,}"),               # Groq API keys
+    re.compile(r"(?i)\bbearer\s+[A-Za-z0-9._~+/=-]+"),  # Authorization headers
+)
+# `extra=` fields are redacted if any word of their name is one of these, so
+# `password_hash`, `groq_api_key` and `refresh_token` are, but `tokens_sent` isn't
+SECRET_FIELD_WORDS = frozenset({
+    "password", "passwd", "secret", "token", "key", "apikey", "authorization", "credential", "credentials", "cookie",
+})
+_FIELD_WORD_SPLIT = re.compile(r"[\W_]+|(?<=[a-z0-9])(?=[A-Z])")
+# Values that are secret whatever they look like
+SECRET_ENV_VARS = ("GROQ_API_KEY", "FLASK_SECRET_KEY")
+
+
+def redact(text):
+    """Return `text` with API keys, bearer tokens and configured secrets masked."""
+    for name in SECRET_ENV_VARS:
+        value = os.getenv(name)
+        if value and len(value) >= 8 and value in text:
+            text = text.replace(value, "[REDACTED]")
+    for pattern in SECRET_PATTERNS:
+        text = pattern.sub("[REDACTED]", text)
+    return text
+
+
+def is_secret_field(name):
+    """True if a log field's name marks its value as secret (see SECRET_FIELD_WORDS)."""
+    return any(word.lower() in SECRET_FIELD_WORDS for word in _FIELD_WORD_SPLIT.split(name))
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the request id and drop sampled-out DEBUG/INFO records."""
+
+    def __init__(self, sample_rate=LOG_SAMPLE_RATE):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        if self.sample_rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        # Decide per request, so a request's records are kept or dropped together
+        if record.request_id is None:
+            return random.random() < self.sample_rate
+        return zlib.crc32(record.request_id.encode()) % 10000 < self.sample_rate * 10000
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id, extra fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage()),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key in _STANDARD_ATTRS or key == "request_id":
+                continue
+            if is_secret_field(key):
+                value = "[REDACTED]"
+            elif isinstance(value, str):
+                value = redact(value)
+            entry[key] = value
+        if record.exc_text:
+            entry["exc"] = redact(record.exc_text)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development, with the same redaction."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        return redact(super().format(record))
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks: records that don't fit are counted and
+    dropped. Starts the listener thread in whichever process logs (so it is
+    running in every forked worker).
+    """
+
+    def __init__(self, handler):
+        super().__init__(queue.Queue(LOG_QUEUE_SIZE))
+        self.handler = handler
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid != os.getpid():
+                # A listener inherited across a fork has no thread in this process
+                self.queue = queue.Queue(LOG_QUEUE_SIZE)
+                self._listener = logging.handlers.QueueListener(self.queue, self.handler, respect_handler_level=True)
+                self._listener.start()
+                self._listener_pid = os.getpid()
+
+    def prepare(self, record):
+        # Exceptions are rendered here, while the traceback still exists; the rest is formatted off-thread
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write out queued records (at exit)."""
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+            self._listener_pid = None
+        if self.dropped:
+            sys.stderr.write(f"logging: dropped {self.dropped} records because the log queue was full\n")
+
+
+_queue_handler = None
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """
+    Route all logging through the background queue. Safe to call more than once;
+    only the first call installs handlers.
+
+    Returns:
+        DroppingQueueHandler: The handler installed on the root logger.
+    """
+    global _queue_handler
+    if _queue_handler is not None:
+        return _queue_handler
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    _queue_handler = DroppingQueueHandler(output)
+    _queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers[:] = [_queue_handler]
+    # Werkzeug's per-request access lines duplicate the app's own request log
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    atexit.register(_queue_handler.stop)
+    return _queue_handler
@@ -0,0 +1,395 @@
+# metrics.py
+"""
+Prometheus metrics for CalmMateAI, served at /metrics.
+
+Counters and histograms are plain dicts updated under a lock, so recording a
+value costs about a microsecond on the request path. Each worker process
+writes its values to METRICS_DIR/<pid>.json every METRICS_FLUSH_SECONDS (and
+whenever it answers a scrape); render() merges every worker's file, so the
+totals are for the whole server whichever gunicorn worker serves /metrics.
+When a worker exits, its file is folded into METRICS_DIR/archive.json (so
+counters never go backwards and the directory doesn't grow with every
+restarted worker): by gunicorn's child_exit hook (gunicorn.conf.py), and by
+collect() for any file whose process is gone (e.g. uvicorn workers).
+METRICS_DIR is emptied when gunicorn starts; it must not be shared between
+hosts, since pids are checked locally.
+"""
+import atexit
+import bisect
+import contextlib
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, so dead workers' files are left alone
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv("METRICS_DIR") or os.path.join(tempfile.gettempdir(), "calmateai-metrics")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds (+Inf is implicit)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# name -> metric, in registration order
+REGISTRY = {}
+
+_lock = threading.Lock()
+_export = False
+_owner_pid = None    # process the recorded values belong to
+_flusher_pid = None  # process running the flush thread
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values tuple -> value
+        REGISTRY[name] = self
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _snapshot(self):
+        return {"type": self.type, "help": self.documentation, "labels": self.labelnames,
+                "values": [[list(key), value] for key, value in self._values.items()]}
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. requests by status code."""
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        _claim()
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (durations in seconds) over fixed buckets."""
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)  # first bucket with value <= bound
+        _claim()
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [per-bucket counts (last is +Inf), sum, count]
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        """Context manager / decorator observing the elapsed time of its block."""
+        return _Timer(self, labels)
+
+    def _snapshot(self):
+        snapshot = super()._snapshot()
+        snapshot["buckets"] = self.buckets
+        return snapshot
+
+
+class _Timer(contextlib.ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # A fresh timer per decorated call, so concurrent calls don't share a start time
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+# --- Per-process storage and flushing ---
+
+def _path(pid):
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+def enable_export():
+    """
+    Have this process, and workers forked from it, write their metrics to
+    METRICS_DIR. Called by the app, so command-line tools that share the
+    instrumented modules (e.g. roster_import) don't show up in /metrics.
+    """
+    global _export
+    _export = True
+    if _owner_pid == os.getpid():
+        _start_flusher()
+
+
+def _claim():
+    """Claim the values for this process; values inherited across a fork belong to the parent."""
+    global _owner_pid
+    if _owner_pid == os.getpid():
+        return
+    with _lock:
+        if _owner_pid == os.getpid():
+            return
+        if _owner_pid is not None:
+            for metric in REGISTRY.values():
+                metric._values.clear()
+        _owner_pid = os.getpid()
+    if _export:
+        _start_flusher()
+
+
+def _start_flusher():
+    global _flusher_pid
+    with _lock:
+        if _flusher_pid == os.getpid() or METRICS_FLUSH_SECONDS <= 0:
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+    # Write the last few seconds' values when the worker exits, before the master archives them
+    atexit.register(_flush_at_exit)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError as e:
+            logger.warning("Could not write metrics to %s: %s", METRICS_DIR, e)
+
+
+def _flush_at_exit():
+    if _flusher_pid == os.getpid():
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def snapshot():
+    """This process's metrics as a JSON-serializable dict."""
+    _claim()
+    with _lock:
+        return {name: metric._snapshot() for name, metric in REGISTRY.items()}
+
+
+def flush():
+    """Write this process's metrics to METRICS_DIR (atomically) and return them."""
+    data = snapshot()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _path(os.getpid())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+    return data
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # missing, being replaced or not ours
+
+
+def _merge(snapshots):
+    """Sum snapshots into {name: metric with "values" as {label tuple: value}}."""
+    merged = {}
+    for data in snapshots:
+        for name, metric in data.items():
+            target = merged.setdefault(name, {**metric, "values": {}})
+            values = target["values"]
+            for key, value in metric["values"]:
+                key = tuple(key)
+                if metric["type"] == "histogram":
+                    if len(value[0]) != len(target["buckets"]) + 1:
+                        continue  # bucket layout changed between deploys
+                    current = values.setdefault(key, [[0] * len(value[0]), 0.0, 0])
+                    current[0] = [a + b for a, b in zip(current[0], value[0])]
+                    current[1] += value[1]
+                    current[2] += value[2]
+                else:
+                    values[key] = values.get(key, 0) + value
+    return merged
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+@contextlib.contextmanager
+def _dir_lock():
+    """
+    Exclusive lock on METRICS_DIR across processes, so a dead worker's file is
+    archived once and never read both on its own and in the archive.
+    """
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        f = open(os.path.join(METRICS_DIR, ".lock"), "a") if fcntl is not None else None
+    except OSError:
+        f = None
+    if f is None:
+        yield False
+        return
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def collect():
+    """Merge the metrics of every worker process (this one's read live), archiving exited ones."""
+    try:
+        own = flush()
+    except OSError:
+        own = snapshot()
+    snapshots = [own]
+    with _dir_lock() as locked:
+        if locked:
+            for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+                pid = os.path.basename(path)[:-len(".json")]
+                if pid.isdigit() and not _pid_alive(int(pid)):
+                    try:
+                        _archive(int(pid))
+                    except OSError as e:
+                        logger.warning("Could not archive metrics of exited process %s: %s", pid, e)
+        for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+            if path != _path(os.getpid()):
+                data = _read(path)
+                if data is not None:
+                    snapshots.append(data)
+    return _merge(snapshots)
+
+
+# --- Worker lifecycle (see gunicorn.conf.py) ---
+
+def reset():
+    """Remove every worker's metrics file, so a new server starts counting from zero."""
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json*")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def mark_process_dead(pid):
+    """Fold an exited worker's metrics into METRICS_DIR/archive.json and remove its file."""
+    with _dir_lock():
+        _archive(pid)
+
+
+def _archive(pid):
+    path = _path(pid)
+    data = _read(path)
+    if data is not None:
+        archive = _path("archive")
+        merged = _merge([d for d in (_read(archive), data) if d is not None])
+        for metric in merged.values():
+            metric["values"] = [[list(key), value] for key, value in metric["values"].items()]
+        tmp = f"{archive}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(merged, f)
+        os.replace(tmp, archive)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# --- Text exposition format ---
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Return all workers' metrics in the Prometheus text format."""
+    lines = []
+    for name, metric in sorted(collect().items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labels"]
+        for key, value in sorted(metric["values"].items()):
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels(labelnames, key)} {_number(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(list(metric["buckets"]) + [float("inf")], counts):
+                cumulative += bucket_count
+                le = (("le", _number(float(bound))),)
+                lines.append(f"{name}_bucket{_labels(labelnames, key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labelnames, key)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labelnames, key)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# --- CalmMateAI metrics ---
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "calmate_http_request_seconds", "Time to handle a request, by route.", ("endpoint", "method"))
+LLM_REQUEST_SECONDS = Histogram(
+    "calmate_llm_request_seconds",
+    "Groq call time until the response (for streams, until it opens), including retries.", ("mode", "outcome"))
+LLM_ATTEMPTS = Counter(
+    "calmate_llm_attempts_total",
+    "Groq call attempts by HTTP status, or timeout / connection_error / error / breaker_open.", ("result",))
+CHAT_FALLBACKS = Counter(
+    "calmate_chat_fallback_total",
+    "Chat replies served from the built-in fallback instead of the LLM, by reason.", ("reason",))
+CHAT_STAGE_SECONDS = Histogram(
+    "calmate_chat_stage_seconds", "Time spent in each /api/chat stage.", ("stage",))
+SERIOUSNESS_LEVELS = Counter(
+    "calmate_seriousness_level_total", "Assessed chat messages by seriousness level.", ("level",))
+DB_QUERY_SECONDS = Histogram(
+    "calmate_db_query_seconds", "User, roster and conversation storage time, by operation.", ("operation",), buckets=DB_BUCKETS)
+PASSWORD_HASH_SECONDS = Histogram(
+    "calmate_password_hash_seconds", "PBKDF2 time including the wait for a hashing thread.", buckets=HASH_BUCKETS)
@@ -1,33 +1,103 @@
 """
 Password hashing using only stdlib (hashlib + secrets).
 Avoids werkzeug/ hashlib.scrypt so it works on Python builds without scrypt support.
+
+PBKDF2 runs on a small dedicated thread pool (hashlib releases the GIL while
+hashing) rather than on the request thread. At most HASH_WORKERS hashes run
+at once and HASH_MAX_QUEUE more may wait; beyond that HashingOverloaded is
+raised immediately so the caller can answer 503. A request thread still waits
+for its hash, so the two together are kept below SERVER_THREADS (the gunicorn
+--threads value): a login burst then gets 503s while at least one thread stays
+free for chat and page requests. Run `python password_utils.py` for a hashes/sec benchmark.
 """
 import base64
 import hashlib
+import hmac
+import os
 import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import PASSWORD_HASH_SECONDS
 
-ITERATIONS = 260000
+ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "260000"))
 SALT_BYTES = 16
 HASH_BYTES = 32
 
+# Request threads per server worker; keep in step with gunicorn --threads (see Procfile)
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "4"))
+# Admission limit: hashes running plus waiting, always below SERVER_THREADS
+HASH_MAX_INFLIGHT = max(1, SERVER_THREADS - 1)
+
+HASH_WORKERS = min(
+    int(os.getenv("HASH_WORKERS", str(min(os.cpu_count() or 1, max(1, SERVER_THREADS // 2))))),
+    HASH_MAX_INFLIGHT,
+)
+HASH_MAX_QUEUE = min(int(os.getenv("HASH_MAX_QUEUE", "0")), HASH_MAX_INFLIGHT - HASH_WORKERS)
+
+
+class HashingOverloaded(RuntimeError):
+    """Too many password hashes are already running or queued."""
+
+
+_executor = None
+_executor_pid = None
+_slots = None
+
+
+def _get_executor():
+    """One pool and admission semaphore per worker process (re-created after fork)."""
+    global _executor, _executor_pid, _slots
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pbkdf2")
+        _slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_MAX_QUEUE)
+        _executor_pid = os.getpid()
+    return _executor, _slots
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int, dklen: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations, dklen=dklen)
+
+
+def _run_pbkdf2(password: str, salt: bytes, iterations: int, dklen: int) -> bytes:
+    """Hash on the bounded pool, or raise HashingOverloaded if it is full."""
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        raise HashingOverloaded("Password hashing is at capacity; try again shortly")
+    with PASSWORD_HASH_SECONDS.time():
+        try:
+            future = executor.submit(_pbkdf2, password, salt, iterations, dklen)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future.result()
+
 
 def hash_password(password: str) -> str:
     """Return a stored hash string for the given password."""
     salt = secrets.token_bytes(SALT_BYTES)
-    h = hashlib.pbkdf2_hmac(
-        "sha256",
-        password.encode("utf-8"),
-        salt,
-        ITERATIONS,
-        dklen=HASH_BYTES,
-    )
+    h = _run_pbkdf2(password, salt, ITERATIONS, HASH_BYTES)
     b64_salt = base64.b64encode(salt).decode("ascii")
     b64_hash = base64.b64encode(h).decode("ascii")
     return f"pbkdf2_sha256${ITERATIONS}${b64_salt}${b64_hash}"
 
 
+def needs_rehash(stored: str) -> bool:
+    """Return True if the stored hash was made with settings other than the current ITERATIONS."""
+    parts = (stored or "").split("$")
+    return len(parts) != 4 or parts[0] != "pbkdf2_sha256" or parts[1] != str(ITERATIONS)
+
+
 def check_password(stored: str, password: str) -> bool:
-    """Return True if password matches the stored hash."""
+    """
+    Return True if password matches the stored hash.
+    Raises HashingOverloaded (instead of returning False) when the hashing pool is full.
+    """
+    # Reject bad input here: from the pool it would surface as an exception, not False
+    if not isinstance(password, str):
+        return False
     try:
         parts = stored.split("$")
         if len(parts) != 4 or parts[0] != "pbkdf2_sha256":
@@ -36,13 +106,35 @@ def check_password(stored: str, password: str) -> bool:
         iters = int(iters)
         salt = base64.b64decode(b64_salt)
         expected = base64.b64decode(b64_hash)
-        h = hashlib.pbkdf2_hmac(
-            "sha256",
-            password.encode("utf-8"),
-            salt,
-            iters,
-            dklen=len(expected),
-        )
-        return h == expected
+        if not 0 < iters <= 2 ** 31 - 1 or not expected:
+            return False
     except Exception:
         return False
+    h = _run_pbkdf2(password, salt, iters, len(expected))
+    return hmac.compare_digest(h, expected)
+
+
+def benchmark(seconds: float = 3.0):
+    """Print PBKDF2 hashes/sec on one thread and on the full pool, per core."""
+    cores = os.cpu_count() or 1
+    salt = secrets.token_bytes(SALT_BYTES)
+
+    count, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        _pbkdf2("benchmark-password", salt, ITERATIONS, HASH_BYTES)
+        count += 1
+    single = count / (time.perf_counter() - started)
+
+    executor, _ = _get_executor()
+    batch = max(HASH_WORKERS, int(single * seconds))
+    started = time.perf_counter()
+    list(executor.map(lambda _: _pbkdf2("benchmark-password", salt, ITERATIONS, HASH_BYTES), range(batch)))
+    pooled = batch / (time.perf_counter() - started)
+
+    print(f"PBKDF2-SHA256, {ITERATIONS} iterations, {cores} cores, HASH_WORKERS={HASH_WORKERS}")
+    print(f"  1 thread: {single:8.1f} hashes/sec ({1000 / single:.1f} ms each)")
+    print(f"  pool:     {pooled:8.1f} hashes/sec ({pooled / min(HASH_WORKERS, cores):.1f} per busy core)")
+
+
+if __name__ == "__main__":
+    benchmark()
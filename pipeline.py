@@ -0,0 +1,86 @@
+# pipeline.py
+"""
+Per-request stage executor.
+
+Independent stages of a request (e.g. the LLM call and seriousness scoring in
+/api/chat) run concurrently, and the caller waits at most until a deadline for
+the whole request. Slow, I/O-bound stages run on a shared, bounded thread
+pool; cheap CPU-bound ones can run `inline` on the calling thread meanwhile,
+so they never queue behind a backlog of slow ones. Stages that miss the
+deadline or raise are reported as missing so the caller can substitute a
+fallback; a late pool stage keeps its thread until it returns, but its
+result is discarded.
+
+The pool defaults to two threads per request thread (SERVER_THREADS), so
+each request thread can have one stage running on time while an earlier,
+late one is still finishing.
+"""
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# Request threads per worker process (gunicorn --threads; see the Procfile)
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "4"))
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS") or 2 * SERVER_THREADS)
+
+_executor = None
+_executor_pid = None
+
+
+def _get_executor():
+    """One pool per worker process (re-created after fork)."""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def run_stages(stages, deadline, inline=()):
+    """
+    Run independent stages concurrently and wait until `deadline` seconds pass.
+
+    Args:
+        stages (dict): {name: zero-argument callable}.
+        deadline (float): Seconds to wait for the whole set of stages.
+        inline (iterable): Names of stages to run on the calling thread, after the
+            others are submitted to the pool. They are not cut off at the deadline,
+            so use this only for short CPU-bound work.
+
+    Returns:
+        tuple: (results dict {name: value} for stages that finished in time,
+                set of names that timed out or raised)
+    """
+    executor = _get_executor()
+    started = time.monotonic()
+    # Each stage gets its own copy of the caller's context (e.g. request ids for logging).
+    futures = {
+        executor.submit(contextvars.copy_context().run, fn): name
+        for name, fn in stages.items() if name not in inline
+    }
+    results = {}
+    missed = set()
+    for name in inline:
+        try:
+            results[name] = stages[name]()
+        except Exception:
+            logger.exception("Pipeline stage '%s' failed", name)
+            missed.add(name)
+    done, _ = wait(futures, timeout=max(0.0, deadline - (time.monotonic() - started)))
+
+    for future, name in futures.items():
+        if future not in done:
+            future.cancel()  # only stops it if it never started
+            missed.add(name)
+            continue
+        error = future.exception()
+        if error is not None:
+            logger.error("Pipeline stage '%s' failed", name, exc_info=error)
+            missed.add(name)
+        else:
+            results[name] = future.result()
+    return results, missed
@@ -0,0 +1,143 @@
+# response_cache.py
+"""
+Cache of LLM chat replies for repeated messages (quick-response buttons,
+common openers like "hi" or "I'm stressed").
+
+Entries are keyed on the normalized message plus the model and a fingerprint
+of the prompt template, so changing either invalidates old replies. There is
+an in-process LRU+TTL tier and, when RESPONSE_CACHE_DB is set, a SQLite tier
+on local disk shared by every worker on the machine.
+
+Messages rated High or Emergency are never cached: those replies must always
+be generated for the person in front of us.
+"""
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# Optional shared tier, e.g. RESPONSE_CACHE_DB=/tmp/calmateai_cache.db
+CACHE_DB = os.getenv("RESPONSE_CACHE_DB")
+CACHE_DB_MAX_ROWS = int(os.getenv("RESPONSE_CACHE_DB_MAX_ROWS", "10000"))
+
+UNCACHEABLE_LEVELS = {"High", "Emergency"}
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " \t\n.,!?;:'\"()-…"
+
+
+def normalize_message(message: str) -> str:
+    """Casefold, collapse whitespace and drop surrounding punctuation."""
+    return _WHITESPACE.sub(" ", (message or "").casefold()).strip(_EDGE_PUNCTUATION)
+
+
+class _SQLiteTier:
+    """Shared on-disk tier; one connection per thread, WAL so workers don't block readers."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT response, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0], row[1] - time.time()
+
+    def set(self, key, response, ttl):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, response, time.time() + ttl),
+            )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune(conn)
+
+    def _prune(self, conn):
+        with conn:
+            conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+            conn.execute(
+                "DELETE FROM response_cache WHERE key NOT IN ("
+                " SELECT key FROM response_cache ORDER BY expires_at DESC LIMIT ?)",
+                (CACHE_DB_MAX_ROWS,),
+            )
+
+
+class ResponseCache:
+    """Two-tier reply cache; see module docstring."""
+
+    def __init__(self, prompt_version, model, size=CACHE_SIZE, ttl=CACHE_TTL, db_path=CACHE_DB):
+        self.prompt_version = prompt_version
+        self.model = model
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=size, ttl=ttl)
+        self.shared = None
+        if db_path and size > 0:
+            try:
+                self.shared = _SQLiteTier(db_path)
+            except sqlite3.Error as e:
+                logger.warning("Response cache: shared tier disabled (%s)", e)
+
+    def key(self, message: str) -> str:
+        raw = f"{self.model}\0{self.prompt_version}\0{normalize_message(message)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, message: str, seriousness_level: str):
+        """Return a cached reply, or None on a miss or for High/Emergency messages."""
+        if seriousness_level in UNCACHEABLE_LEVELS or not normalize_message(message):
+            return None
+        key = self.key(message)
+        response = self.memory.get(key)
+        if response is not None or self.shared is None:
+            return response
+        try:
+            hit = self.shared.get(key)
+        except sqlite3.Error as e:
+            logger.warning("Response cache read error: %s", e)
+            return None
+        if hit is None:
+            return None
+        response, remaining_ttl = hit
+        self.memory.set(key, response, ttl=remaining_ttl)
+        return response
+
+    def put(self, message: str, response: str, seriousness_level: str):
+        """Cache an LLM reply unless the message was rated High or Emergency."""
+        if seriousness_level in UNCACHEABLE_LEVELS or not response or not normalize_message(message):
+            return
+        key = self.key(message)
+        self.memory.set(key, response)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, response, self.ttl)
+            except sqlite3.Error as e:
+                logger.warning("Response cache write error: %s", e)
@@ -0,0 +1,145 @@
+# roster_import.py
+"""
+Bulk import of university student rosters into the SQLite roster table.
+
+    python roster_import.py rosters.csv
+    python roster_import.py rosters.jsonl --batch-size 5000 --workers 8
+    python roster_import.py university_students.json    # the original nested format
+
+CSV and JSONL rows need `university` and `student_id`, plus either `password`
+(plaintext, hashed here on a process pool) or `password_hash` (an existing
+pbkdf2_sha256 hash, stored as is); `email` is optional. Rows are streamed and
+written one transaction per batch, so memory stays flat for any roster size.
+Existing students are updated, so an interrupted import can simply be rerun.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from database import save_students
+from password_utils import hash_password
+from university_auth import roster_key
+
+BATCH_SIZE = 1000
+
+
+def read_rows(path, fmt=None):
+    """
+    Yield roster rows as dicts from a CSV, JSONL or legacy JSON file.
+
+    Args:
+        path (str): The roster file.
+        fmt (str): "csv", "jsonl" or "json"; by default taken from the file extension.
+    """
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt == 'csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+    elif fmt in ('jsonl', 'ndjson'):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif fmt == 'json':
+        # {university: {"students": {student_id: {"password", "email"}}}}
+        with open(path, encoding='utf-8') as f:
+            universities = json.load(f)
+        for university, info in universities.items():
+            for student_id, student in info.get('students', {}).items():
+                yield {'university': university, 'student_id': student_id, **student}
+    else:
+        raise ValueError(f"Unsupported roster format '{fmt}' (use csv, jsonl or json)")
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_rows(rows, batch_size=BATCH_SIZE, executor=None, progress=None):
+    """
+    Write roster rows in batches, hashing plaintext passwords.
+
+    Args:
+        rows (iterable): Row dicts as produced by read_rows.
+        batch_size (int): Rows per transaction.
+        executor: Optional process pool for hashing; hashes in this process if None.
+        progress (callable): Called with the running total after each batch.
+
+    Returns:
+        int: Number of students written.
+    """
+    total = 0
+    line = 0
+    for batch in _batches(rows, batch_size):
+        entries = []
+        plaintext = []  # (entry index, password)
+        for row in batch:
+            line += 1
+            university = (row.get('university') or '').strip()
+            student_id = (row.get('student_id') or '').strip()
+            password_hash = row.get('password_hash') or None
+            password = row.get('password')
+            if not university or not student_id or not (password_hash or password):
+                raise ValueError(f"Row {line}: university, student_id and password or password_hash are required")
+            if password_hash is None:
+                plaintext.append((len(entries), password))
+            entries.append([roster_key(university), student_id, row.get('email') or None, password_hash])
+        if plaintext:
+            passwords = [password for _, password in plaintext]
+            if executor is not None:
+                hashes = executor.map(hash_password, passwords, chunksize=max(1, len(passwords) // 32))
+            else:
+                hashes = map(hash_password, passwords)
+            for (i, _), password_hash in zip(plaintext, hashes):
+                entries[i][3] = password_hash
+        save_students(entries)
+        total += len(entries)
+        if progress:
+            progress(total)
+    return total
+
+
+def import_file(path, fmt=None, batch_size=BATCH_SIZE, workers=1, progress=None):
+    """Import one roster file; `workers` > 1 hashes on that many processes."""
+    rows = read_rows(path, fmt)
+    if workers <= 1:
+        return import_rows(rows, batch_size, progress=progress)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return import_rows(rows, batch_size, executor, progress)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import university student rosters.")
+    parser.add_argument("path", help="CSV, JSONL or legacy JSON roster file")
+    parser.add_argument("--format", choices=("csv", "jsonl", "json"), help="default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per transaction")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for password hashing")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+
+    def progress(total):
+        elapsed = time.perf_counter() - started
+        print(f"\r{total} students imported ({total / elapsed:.0f}/s)", end="", flush=True)
+
+    try:
+        total = import_file(args.path, args.format, args.batch_size, args.workers, progress)
+    except ValueError as e:
+        print(f"\nImport stopped: {e} (earlier batches were saved)", file=sys.stderr)
+        return 1
+    print(f"\nDone: {total} students in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
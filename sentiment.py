@@ -0,0 +1,380 @@
+# sentiment.py
+"""
+Compact VADER sentiment scorer with the same compound score as NLTK's
+SentimentIntensityAnalyzer.
+
+The lexicon is read straight from NLTK's vader_lexicon.zip into a dict the
+first time a score is needed, without importing NLTK itself, and the VADER
+rules run over precomputed lowercase tokens. compound_scores() scores many
+messages at once, finishing the per-message sums with NumPy when it is installed.
+
+Run `python sentiment.py` to check parity against NLTK on a reference corpus.
+"""
+import math
+import os
+import string
+import sys
+import threading
+import zipfile
+
+# Where NLTK looks for data, in the same order (see nltk.data.path).
+_NLTK_DATA_DIRS = [
+    *filter(None, os.getenv("NLTK_DATA", "").split(os.pathsep)),
+    os.path.expanduser("~/nltk_data"),
+    os.path.join(sys.prefix, "nltk_data"),
+    os.path.join(sys.prefix, "share", "nltk_data"),
+    os.path.join(sys.prefix, "lib", "nltk_data"),
+    "/usr/share/nltk_data",
+    "/usr/local/share/nltk_data",
+    "/usr/lib/nltk_data",
+    "/usr/local/lib/nltk_data",
+]
+_LEXICON_MEMBER = "vader_lexicon/vader_lexicon.txt"
+
+# --- VADER constants (from NLTK's VaderConstants) ---
+B_INCR = 0.293
+B_DECR = -0.293
+C_INCR = 0.733
+N_SCALAR = -0.74
+
+NEGATE = frozenset({
+    "aint", "arent", "cannot", "cant", "couldnt", "darent", "didnt", "doesnt",
+    "ain't", "aren't", "can't", "couldn't", "daren't", "didn't", "doesn't",
+    "dont", "hadnt", "hasnt", "havent", "isnt", "mightnt", "mustnt", "neither",
+    "don't", "hadn't", "hasn't", "haven't", "isn't", "mightn't", "mustn't",
+    "neednt", "needn't", "never", "none", "nope", "nor", "not", "nothing",
+    "nowhere", "oughtnt", "shant", "shouldnt", "uhuh", "wasnt", "werent",
+    "oughtn't", "shan't", "shouldn't", "uh-uh", "wasn't", "weren't", "without",
+    "wont", "wouldnt", "won't", "wouldn't", "rarely", "seldom", "despite",
+})
+
+BOOSTER_DICT = {
+    **dict.fromkeys([
+        "absolutely", "amazingly", "awfully", "completely", "considerably", "decidedly",
+        "deeply", "effing", "enormously", "entirely", "especially", "exceptionally",
+        "extremely", "fabulously", "flipping", "flippin", "fricking", "frickin",
+        "frigging", "friggin", "fully", "fucking", "greatly", "hella", "highly",
+        "hugely", "incredibly", "intensely", "majorly", "more", "most", "particularly",
+        "purely", "quite", "really", "remarkably", "so", "substantially", "thoroughly",
+        "totally", "tremendously", "uber", "unbelievably", "unusually", "utterly", "very",
+    ], B_INCR),
+    **dict.fromkeys([
+        "almost", "barely", "hardly", "just enough", "kind of", "kinda", "kindof",
+        "kind-of", "less", "little", "marginally", "occasionally", "partly", "scarcely",
+        "slightly", "somewhat", "sort of", "sorta", "sortof", "sort-of",
+    ], B_DECR),
+}
+
+SPECIAL_CASE_IDIOMS = {
+    "the shit": 3,
+    "the bomb": 3,
+    "bad ass": 1.5,
+    "yeah right": -2,
+    "cut the mustard": 2,
+    "kiss of death": -1.5,
+    "hand to mouth": -2,
+}
+
+PUNC_LIST = frozenset([
+    ".", "!", "?", ",", ";", ":", "-", "'", '"', "!!", "!!!", "??", "???",
+    "?!?", "!?!", "?!?!", "!?!?",
+])
+_MAX_PUNC_LEN = max(len(p) for p in PUNC_LIST)
+_REMOVE_PUNCTUATION = str.maketrans("", "", string.punctuation)
+
+
+def find_lexicon():
+    """Return the path of NLTK's vader_lexicon.zip, or None if it is not installed."""
+    explicit = os.getenv("VADER_LEXICON")
+    if explicit:
+        return explicit
+    for directory in _NLTK_DATA_DIRS:
+        path = os.path.join(directory, "sentiment", "vader_lexicon.zip")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_lexicon(path):
+    """Parse a VADER lexicon (the NLTK zip or a plain .txt) into {token: valence}."""
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as zf:
+            text = zf.read(_LEXICON_MEMBER).decode("utf-8")
+    else:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    lexicon = {}
+    for line in text.split("\n"):
+        parts = line.strip().split("\t")
+        if len(parts) >= 2:
+            lexicon[parts[0]] = float(parts[1])
+    return lexicon
+
+
+def _tokenize(text):
+    """
+    VADER's SentiText tokenization: whitespace split, drop single characters,
+    and strip one leading or trailing punctuation mark (from PUNC_LIST) from a
+    token when the bare word also occurs in the text.
+    """
+    raw = text.split()
+    words_only = {w for w in text.translate(_REMOVE_PUNCTUATION).split() if len(w) > 1}
+    tokens = []
+    for we in raw:
+        if len(we) <= 1:
+            continue
+        stripped = None
+        for k in range(1, min(_MAX_PUNC_LEN, len(we) - 1) + 1):
+            if we[-k:] in PUNC_LIST and we[:-k] in words_only:
+                stripped = we[:-k]
+                break
+        if stripped is None:
+            for k in range(1, min(_MAX_PUNC_LEN, len(we) - 1) + 1):
+                if we[:k] in PUNC_LIST and we[k:] in words_only:
+                    stripped = we[k:]
+                    break
+        tokens.append(stripped if stripped is not None else we)
+    return tokens
+
+
+def _numpy():
+    """NumPy is optional and imported on first batch, not at import time."""
+    try:
+        import numpy
+    except ImportError:  # batches fall back to pure Python
+        return None
+    return numpy
+
+
+def _negated(word):
+    word = word.lower()
+    return word in NEGATE or "n't" in word
+
+
+def _punctuation_amplifier(text):
+    ep_count = min(text.count("!"), 4)
+    qm_count = text.count("?")
+    qm_amplifier = 0
+    if qm_count > 1:
+        qm_amplifier = qm_count * 0.18 if qm_count <= 3 else 0.96
+    return ep_count * 0.292 + qm_amplifier
+
+
+class VaderScorer:
+    """VADER compound scoring over a preloaded lexicon dict."""
+
+    def __init__(self, lexicon):
+        self.lexicon = lexicon
+
+    def _scalar_inc_dec(self, word, valence, is_cap_diff):
+        scalar = BOOSTER_DICT.get(word.lower(), 0.0)
+        if scalar:
+            if valence < 0:
+                scalar *= -1
+            if word.isupper() and is_cap_diff:
+                scalar += C_INCR if valence > 0 else -C_INCR
+        return scalar
+
+    def _idioms_check(self, valence, words, i):
+        onezero = f"{words[i - 1]} {words[i]}"
+        twoonezero = f"{words[i - 2]} {words[i - 1]} {words[i]}"
+        twoone = f"{words[i - 2]} {words[i - 1]}"
+        threetwoone = f"{words[i - 3]} {words[i - 2]} {words[i - 1]}"
+        threetwo = f"{words[i - 3]} {words[i - 2]}"
+        for seq in (onezero, twoonezero, twoone, threetwoone, threetwo):
+            if seq in SPECIAL_CASE_IDIOMS:
+                valence = SPECIAL_CASE_IDIOMS[seq]
+                break
+        if len(words) - 1 > i:
+            zeroone = f"{words[i]} {words[i + 1]}"
+            if zeroone in SPECIAL_CASE_IDIOMS:
+                valence = SPECIAL_CASE_IDIOMS[zeroone]
+        if len(words) - 1 > i + 1:
+            zeroonetwo = f"{words[i]} {words[i + 1]} {words[i + 2]}"
+            if zeroonetwo in SPECIAL_CASE_IDIOMS:
+                valence = SPECIAL_CASE_IDIOMS[zeroonetwo]
+        if threetwo in BOOSTER_DICT or twoone in BOOSTER_DICT:
+            valence = valence + B_DECR
+        return valence
+
+    def _never_check(self, valence, words, start_i, i):
+        if start_i == 0:
+            if _negated(words[i - 1]):
+                valence = valence * N_SCALAR
+        elif start_i == 1:
+            if words[i - 2] == "never" and words[i - 1] in ("so", "this"):
+                valence = valence * 1.5
+            elif _negated(words[i - 2]):
+                valence = valence * N_SCALAR
+        else:
+            if (words[i - 3] == "never" and words[i - 2] in ("so", "this")) or words[i - 1] in ("so", "this"):
+                valence = valence * 1.25
+            elif _negated(words[i - 3]):
+                valence = valence * N_SCALAR
+        return valence
+
+    def _valence(self, words, lowered, i, is_cap_diff):
+        """Valence of the token at position i (VADER's sentiment_valence + least check)."""
+        item_lower = lowered[i]
+        if (i < len(words) - 1 and item_lower == "kind" and lowered[i + 1] == "of") or item_lower in BOOSTER_DICT:
+            return 0
+        lexicon = self.lexicon
+        if item_lower not in lexicon:
+            return 0
+        valence = lexicon[item_lower]
+        if words[i].isupper() and is_cap_diff:
+            valence += C_INCR if valence > 0 else -C_INCR
+        for start_i in range(3):
+            if i > start_i and lowered[i - (start_i + 1)] not in lexicon:
+                s = self._scalar_inc_dec(words[i - (start_i + 1)], valence, is_cap_diff)
+                if start_i == 1 and s != 0:
+                    s = s * 0.95
+                if start_i == 2 and s != 0:
+                    s = s * 0.9
+                valence = valence + s
+                valence = self._never_check(valence, words, start_i, i)
+                if start_i == 2:
+                    valence = self._idioms_check(valence, words, i)
+        # negation using "least" (but not "at least" / "very least")
+        if i > 1 and lowered[i - 1] not in lexicon and lowered[i - 1] == "least":
+            if lowered[i - 2] != "at" and lowered[i - 2] != "very":
+                valence = valence * N_SCALAR
+        elif i > 0 and lowered[i - 1] not in lexicon and lowered[i - 1] == "least":
+            valence = valence * N_SCALAR
+        return valence
+
+    def sentiments(self, text):
+        """Per-token valences after the 'but' rule, as VADER computes them."""
+        if not isinstance(text, str):
+            text = str(text.encode("utf-8"))
+        words = _tokenize(text)
+        if not words:
+            return []
+        lowered = [w.lower() for w in words]
+        allcaps = sum(1 for w in words if w.isupper())
+        is_cap_diff = 0 < len(words) - allcaps < len(words)
+
+        # NLTK scores every occurrence of a token at its first position; keep that.
+        by_token = {}
+        sentiments = []
+        for i, word in enumerate(words):
+            valence = by_token.get(word)
+            if valence is None:
+                valence = by_token[word] = self._valence(words, lowered, i, is_cap_diff)
+            sentiments.append(valence)
+
+        if "but" in lowered:
+            bi = lowered.index("but")
+            sentiments = [s * 0.5 if idx < bi else s * 1.5 if idx > bi else s
+                          for idx, s in enumerate(sentiments)]
+        return sentiments
+
+    def compound(self, text):
+        """Compound score in [-1, 1], rounded to 4 places like NLTK."""
+        sentiments = self.sentiments(text)
+        if not sentiments:
+            return 0.0
+        sum_s = float(sum(sentiments))
+        amplifier = _punctuation_amplifier(text)
+        if sum_s > 0:
+            sum_s += amplifier
+        elif sum_s < 0:
+            sum_s -= amplifier
+        return round(sum_s / math.sqrt(sum_s * sum_s + 15), 4)
+
+    def compound_scores(self, texts):
+        """Compound scores for many texts; the final arithmetic is vectorized with NumPy."""
+        np = _numpy()
+        texts = list(texts)
+        if np is None or not texts:
+            return [self.compound(text) for text in texts]
+        per_text = [self.sentiments(text) for text in texts]
+        sums = np.array([float(sum(s)) for s in per_text])
+        amplifiers = np.array([_punctuation_amplifier(text) for text in texts])
+        sums = sums + np.sign(sums) * amplifiers
+        compounds = sums / np.sqrt(sums * sums + 15)
+        return [round(float(c), 4) if s else 0.0 for c, s in zip(compounds, per_text)]
+
+
+_scorer = None
+_scorer_lock = threading.Lock()
+
+
+def get_scorer():
+    """Return the shared VaderScorer, loading the lexicon on first use; None if unavailable."""
+    global _scorer
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                path = find_lexicon()
+                if path is None:
+                    return None
+                _scorer = VaderScorer(load_lexicon(path))
+    return _scorer
+
+
+# --- Parity check against NLTK ---
+REFERENCE_CORPUS = [
+    "I feel great today!",
+    "I am so sad and lonely.",
+    "This is not good at all",
+    "I'm not happy, but I'm okay",
+    "I am VERY angry right now!!!",
+    "Everything is TERRIBLE and I hate it",
+    "kind of sad, sort of tired",
+    "I have never been so happy",
+    "At least I'm not alone",
+    "least happy day ever",
+    "This movie was the bomb :)",
+    "yeah right, like that would work",
+    "I'm barely coping with all of this stress",
+    "I don't know what to do anymore?? Why???",
+    "I can't go on like this",
+    "Thank you so much, you really helped :D",
+    "I want to end my life",
+    "hopeless worthless trapped scared",
+    "My exams are tomorrow and I'm extremely nervous",
+    "good good good bad bad",
+    "It was fine. Not great, not terrible.",
+    "I was happy, but now I feel awful.",
+    "WOW!!!! amazing",
+    "the kiss of death for my grades",
+    "I hardly slept and I'm exhausted",
+    "",
+    "ok",
+    "I'm fine...",
+    "Life is beautiful; nothing is wrong",
+    "I feel nothing but pain",
+]
+
+
+if __name__ == "__main__":
+    import time
+
+    scorer = get_scorer()
+    if scorer is None:
+        sys.exit("VADER lexicon not found; run: python -m nltk.downloader vader_lexicon")
+
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+    reference = SentimentIntensityAnalyzer()
+    mismatches = 0
+    for text in REFERENCE_CORPUS:
+        expected = reference.polarity_scores(text)["compound"]
+        got = scorer.compound(text)
+        if abs(expected - got) > 1e-4:
+            mismatches += 1
+            print(f"MISMATCH {text!r}: nltk={expected} fast={got}")
+    batch = scorer.compound_scores(REFERENCE_CORPUS)
+    mismatches += sum(1 for text, got in zip(REFERENCE_CORPUS, batch)
+                      if abs(reference.polarity_scores(text)["compound"] - got) > 1e-4)
+    print(f"Parity: {len(REFERENCE_CORPUS) - mismatches}/{len(REFERENCE_CORPUS)} match NLTK")
+
+    corpus = REFERENCE_CORPUS * 100
+    for label, fn in (("nltk", lambda: [reference.polarity_scores(t) for t in corpus]),
+                      ("fast", lambda: [scorer.compound(t) for t in corpus]),
+                      ("fast batch", lambda: scorer.compound_scores(corpus))):
+        started = time.perf_counter()
+        fn()
+        print(f"{label:>10}: {(time.perf_counter() - started) / len(corpus) * 1e6:.1f} us/message")
+    sys.exit(1 if mismatches else 0)
@@ -1,24 +1,100 @@
 # seriousness_detector.py
 
+import logging
+import os
 import re
-import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# Sentiment engine: "fast" (sentiment.py, default), "nltk" (NLTK's VADER) or "off".
+SENTIMENT_ENGINE = os.getenv("SENTIMENT_ENGINE", "fast").lower()
+
+
+class _NltkVader:
+    """NLTK's SentimentIntensityAnalyzer behind the same interface as sentiment.VaderScorer."""
+
+    def __init__(self):
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer
+        self._analyzer = SentimentIntensityAnalyzer()
+
+    def compound(self, text):
+        return self._analyzer.polarity_scores(text)["compound"]
+
+    def compound_scores(self, texts):
+        return [self.compound(text) for text in texts]
+
 
 # Try to initialize VADER sentiment analyzer.
 # If the lexicon isn't available (e.g. on Render), we skip sentiment
 # and fall back to keyword-only rules instead of crashing.
-try:
-    nltk.data.find("sentiment/vader_lexicon.zip")
-    analyzer = SentimentIntensityAnalyzer()
-except LookupError:
-    print("VADER lexicon not found; skipping sentiment analysis.")
-    analyzer = None
+analyzer = None
+if SENTIMENT_ENGINE == "nltk":
+    try:
+        analyzer = _NltkVader()
+    except LookupError:
+        analyzer = None
+elif SENTIMENT_ENGINE != "off":
+    from sentiment import get_scorer
+    analyzer = get_scorer()
+if analyzer is None and SENTIMENT_ENGINE != "off":
+    logger.warning("VADER lexicon not found; skipping sentiment analysis.")
+
+# Seriousness levels from least to most serious.
+LEVELS = ("Low", "Medium", "High", "Emergency")
+
+# Keyword rules per level, most serious first.
+SEVERITY_KEYWORDS = {
+    "Emergency": r"suicide|kill myself|end my life|die|self-harm|harm myself|cutting|overdose|in danger|i need help now",
+    "High": r"hopeless|worthless|can't go on|give up|no purpose|can't take it anymore|lost|alone|trapped|scared|crisis|panic attack|anxious|depressed|depression|extreme pain|severe pain|unbearable pain|debilitating pain",
+    "Medium": r"stress|stressed|anxious|anxiety|sad|unhappy|tired|overwhelmed|struggling|bad day|tough time|feeling down",
+}
+
+# All rules compiled once into a single pattern with one named group per level.
+# Groups are ordered most serious first, so a keyword listed under two levels
+# ("anxious") is reported at the higher one.
+SEVERITY_PATTERN = re.compile(
+    "|".join(rf"(?P<{level.lower()}>\b(?:{keywords})\b)" for level, keywords in SEVERITY_KEYWORDS.items()),
+    re.IGNORECASE,
+)
+_GROUP_LEVELS = {level.lower(): level for level in SEVERITY_KEYWORDS}
+_RANK = {level: rank for rank, level in enumerate(LEVELS)}
+
+# Compound VADER score at or below which a message is at least Medium.
+NEGATIVE_SENTIMENT_THRESHOLD = -0.5
+
+
+def match_seriousness_keywords(user_input):
+    """
+    Scan the message once for seriousness keywords.
+
+    Returns:
+        tuple: (highest keyword level or "Low", list of (level, start, end, text) matches)
+    """
+    level = "Low"
+    matches = []
+    for m in SEVERITY_PATTERN.finditer(user_input or ""):
+        match_level = _GROUP_LEVELS[m.lastgroup]
+        matches.append((match_level, m.start(), m.end(), m.group(0)))
+        if _RANK[match_level] > _RANK[level]:
+            level = match_level
+    return level, matches
+
+
+def _combine(keyword_level, compound_score):
+    """Apply the sentiment rule to a keyword-only level."""
+    if keyword_level in ("High", "Emergency"):
+        return keyword_level
+    # If the compound sentiment score is very negative, it is at least a medium level
+    if compound_score is not None and compound_score <= NEGATIVE_SENTIMENT_THRESHOLD:
+        return "Medium"
+    return keyword_level
+
 
 def get_seriousness_level(user_input, qa_chain_for_llm_check=None):
     """
     Analyzes the user's message to determine a seriousness level.
     Uses keyword matching and sentiment analysis.
-    
+
     Args:
         user_input (str): The text message from the user.
         qa_chain_for_llm_check: (unused) kept for backward compatibility.
@@ -26,36 +102,37 @@ def get_seriousness_level(user_input, qa_chain_for_llm_check=None):
     Returns:
         str: The seriousness level ("Low", "Medium", "High", or "Emergency").
     """
-    
-    # --- Keyword and Pattern Matching (Rule-based) ---
-    emergency_keywords = re.compile(
-        r'\b(suicide|kill myself|end my life|die|self-harm|harm myself|cutting|overdose|in danger|i need help now)\b',
-        re.IGNORECASE
-    )
-    high_keywords = re.compile(
-        r"\b(hopeless|worthless|can't go on|give up|no purpose|can't take it anymore|lost|alone|trapped|scared|crisis|panic attack|anxious|depressed|depression|extreme pain|severe pain|unbearable pain|debilitating pain)\b",
-        re.IGNORECASE
-    )
-    medium_keywords = re.compile(
-        r'\b(stress|stressed|anxious|anxiety|sad|unhappy|tired|overwhelmed|struggling|bad day|tough time|feeling down)\b',
-        re.IGNORECASE
-    )
-
-    if emergency_keywords.search(user_input):
-        return "Emergency"
-    if high_keywords.search(user_input):
-        return "High"
-    
+    # --- Keyword and Pattern Matching (Rule-based, single pass) ---
+    keyword_level, _ = match_seriousness_keywords(user_input)
+    if keyword_level in ("High", "Emergency"):
+        return keyword_level
+
     # --- Sentiment Analysis (Nuance-based) ---
     # We only run this if the keywords didn't trigger a High or Emergency level
+    compound_score = None
     if analyzer is not None:
-        sentiment = analyzer.polarity_scores(user_input)
-        compound_score = sentiment["compound"]
-        
-        # If the compound sentiment score is very negative, it might be a medium level
-        if compound_score <= -0.5:
-            return "Medium"
-    
-    # --- Default Level ---
-    # If none of the above conditions are met, default to 'Low'
-    return "Low"
+        compound_score = analyzer.compound(user_input)
+    return _combine(keyword_level, compound_score)
+
+
+def get_seriousness_levels(messages):
+    """
+    Batch version of get_seriousness_level for history and transcript backfills.
+
+    Args:
+        messages (iterable of str): The messages to score.
+
+    Returns:
+        list: One seriousness level per message, in order.
+    """
+    messages = list(messages)
+    keyword_levels = [match_seriousness_keywords(message)[0] for message in messages]
+    levels = list(keyword_levels)
+    if analyzer is None:
+        return levels
+    # Sentiment only for messages the keywords left below High, scored as one batch
+    pending = [i for i, level in enumerate(keyword_levels) if level not in ("High", "Emergency")]
+    scores = analyzer.compound_scores([messages[i] for i in pending])
+    for i, compound_score in zip(pending, scores):
+        levels[i] = _combine(keyword_levels[i], compound_score)
+    return levels
@@ -169,6 +169,75 @@ document.addEventListener('DOMContentLoaded', () => {
         return wrapper;
     };
     
+    // --- SIDEBAR: SERIOUSNESS + SUGGESTIONS ---
+    const renderSeriousness = (data) => {
+        if (data.seriousness_level && data.suggestions) {
+            suggestionsContainer.classList.remove('hidden');
+            if (window.innerWidth <= 768) suggestionsContainer.classList.add('show');
+
+            seriousnessOutput.textContent = `Seriousness Level: ${data.seriousness_level}`;
+            suggestionsOutput.className = 'text-sm text-slate-700 markdown-content';
+            let colorClass;
+            const level = data.seriousness_level.toLowerCase();
+            if (level.includes('low')) colorClass = 'seriousness-low';
+            else if (level.includes('medium')) colorClass = 'seriousness-medium';
+            else if (level.includes('high') || level.includes('critical') || level.includes('emergency')) colorClass = 'seriousness-high';
+            suggestionsOutput.classList.add(colorClass);
+            const mdHtml = marked.parse(data.suggestions);
+            const decorated = mdHtml
+              .replace(/<li>(Take a short walk|Go for a walk|Stretch)/gi, '<li>🚶 $1')
+              .replace(/<li>(Practice .*breathing|Deep breathing)/gi, '<li>🫁 $1')
+              .replace(/<li>(5-minute meditation|meditation)/gi, '<li>🧘 $1')
+              .replace(/<li>(Listen to .*music)/gi, '<li>🎶 $1')
+              .replace(/<li>(Connect with .*friend|family)/gi, '<li>🤝 $1')
+              .replace(/<li>(Call .*emergency|hotline|helpline)/gi, '<li>📞 $1');
+            suggestionsOutput.innerHTML = decorated;
+
+            // Emphasize emergency
+            const emergencyBanner = document.getElementById('emergency-banner');
+            if (emergencyBanner) {
+                if (level.includes('high') || level.includes('emergency') || level.includes('critical')) emergencyBanner.classList.remove('hidden');
+                else emergencyBanner.classList.add('hidden');
+            }
+        } else {
+            suggestionsContainer.classList.add('hidden');
+            suggestionsContainer.classList.remove('show');
+        }
+    };
+
+    // --- STREAMED CHAT RESPONSE (server-sent events over fetch) ---
+    /**
+     * Reads `token` events into the typing bubble as they arrive and resolves
+     * with the payload of the final `done` event.
+     */
+    const readChatStream = async (response, onToken) => {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let final = null;
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let eventName = 'message';
+                let dataLine = '';
+                rawEvent.split('\n').forEach((line) => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) dataLine += line.slice(5).trim();
+                });
+                if (!dataLine) continue;
+                const payload = JSON.parse(dataLine);
+                if (eventName === 'token') onToken(payload.token);
+                else if (eventName === 'done') final = payload;
+            }
+        }
+        return final;
+    };
+
     // --- API CALL FOR CHAT ---
     const sendMessage = async () => {
         const message = userInput.value.trim();
@@ -187,17 +256,32 @@ document.addEventListener('DOMContentLoaded', () => {
         }, 500);
 
         try {
-            const response = await fetch('/api/chat', {
+            const canStream = !!(window.ReadableStream && window.TextDecoder);
+            const response = await fetch(canStream ? '/api/chat/stream' : '/api/chat', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ message: message })
             });
 
-            clearInterval(loadingInterval);
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
 
-            const data = await response.json();
+            let data;
+            if (canStream && response.body) {
+                // Replace the typing dots with tokens as soon as the first one arrives
+                let streamed = '';
+                data = await readChatStream(response, (token) => {
+                    if (!streamed) clearInterval(loadingInterval);
+                    streamed += token;
+                    if (loadingElement) loadingElement.textContent = streamed;
+                    scrollToBottom();
+                });
+            } else {
+                data = await response.json();
+            }
+
+            clearInterval(loadingInterval);
             loadingMessage.remove();
+            if (!data) throw new Error('Chat stream ended without a response');
             if (data.ai_response) {
                 appendMessage('ai', data.ai_response);
                 // Ensure scroll after AI response
@@ -205,38 +289,7 @@ document.addEventListener('DOMContentLoaded', () => {
             }
 
             // Sidebar content
-            if (data.seriousness_level && data.suggestions) {
-                suggestionsContainer.classList.remove('hidden');
-                if (window.innerWidth <= 768) suggestionsContainer.classList.add('show');
-
-                seriousnessOutput.textContent = `Seriousness Level: ${data.seriousness_level}`;
-                suggestionsOutput.className = 'text-sm text-slate-700 markdown-content';
-                let colorClass;
-                const level = data.seriousness_level.toLowerCase();
-                if (level.includes('low')) colorClass = 'seriousness-low';
-                else if (level.includes('medium')) colorClass = 'seriousness-medium';
-                else if (level.includes('high') || level.includes('critical') || level.includes('emergency')) colorClass = 'seriousness-high';
-                suggestionsOutput.classList.add(colorClass);
-                const mdHtml = marked.parse(data.suggestions);
-                const decorated = mdHtml
-                  .replace(/<li>(Take a short walk|Go for a walk|Stretch)/gi, '<li>🚶 $1')
-                  .replace(/<li>(Practice .*breathing|Deep breathing)/gi, '<li>🫁 $1')
-                  .replace(/<li>(5-minute meditation|meditation)/gi, '<li>🧘 $1')
-                  .replace(/<li>(Listen to .*music)/gi, '<li>🎶 $1')
-                  .replace(/<li>(Connect with .*friend|family)/gi, '<li>🤝 $1')
-                  .replace(/<li>(Call .*emergency|hotline|helpline)/gi, '<li>📞 $1');
-                suggestionsOutput.innerHTML = decorated;
-
-                // Emphasize emergency
-                const emergencyBanner = document.getElementById('emergency-banner');
-                if (emergencyBanner) {
-                    if (level.includes('high') || level.includes('emergency') || level.includes('critical')) emergencyBanner.classList.remove('hidden');
-                    else emergencyBanner.classList.add('hidden');
-                }
-            } else {
-                suggestionsContainer.classList.add('hidden');
-                suggestionsContainer.classList.remove('show');
-            }
+            renderSeriousness(data);
         } catch (error) {
             clearInterval(loadingInterval);
             loadingMessage.remove();
@@ -290,6 +343,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
     const voiceBtn = document.getElementById('voice-btn');
     const voiceStatus = document.getElementById('voice-status');
+    // How often to check on a server-side transcription
+    const VOICE_POLL_MS = 1000;
 
     const formatElapsed = (ms) => {
         const s = Math.floor(ms / 1000);
@@ -333,12 +388,45 @@ document.addEventListener('DOMContentLoaded', () => {
 
     const stopSpeechRecognition = () => { try { recognition && recognition.stop(); } catch(e){} recognition = null; };
 
+    // No browser transcript (e.g. no Web Speech API): transcribe the recording on the server
+    const transcribeOnServer = async (audioBlob) => {
+        const notice = appendMessage('ai', 'Transcribing your voice message...');
+        try {
+            const upload = await fetch('/api/voice', {
+                method: 'POST',
+                headers: { 'Content-Type': audioBlob.type || 'audio/webm' },
+                body: audioBlob
+            });
+            if (!upload.ok) throw new Error(`HTTP error! status: ${upload.status}`);
+            let job = await upload.json();
+            const statusUrl = job.status_url;
+            // Poll until the job finishes; each status request returns at once
+            while (job.status === 'queued' || job.status === 'running') {
+                await new Promise(resolve => setTimeout(resolve, VOICE_POLL_MS));
+                const poll = await fetch(statusUrl);
+                if (!poll.ok) throw new Error(`HTTP error! status: ${poll.status}`);
+                job = await poll.json();
+            }
+            notice.remove();
+            if (job.status !== 'done' || !job.transcript) {
+                appendMessage('ai', job.error || 'Sorry, I could not understand the audio.');
+                return;
+            }
+            userInput.value = job.transcript;
+            sendMessage();
+        } catch (error) {
+            notice.remove();
+            console.error('Error transcribing voice message:', error);
+            appendMessage('ai', "I'm sorry, I couldn't process that voice message. Please try typing instead.");
+        }
+    };
+
     const startRecording = async () => {
         try {
             // Prefer Web Speech API for immediate transcript if available
             const srStarted = startSpeechRecognition();
 
-            // Also start MediaRecorder to keep future option to upload audio
+            // Also record audio, uploaded for server-side transcription if there's no transcript
             const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
             mediaRecorder = new MediaRecorder(stream);
             currentStream = stream;
@@ -346,12 +434,14 @@ document.addEventListener('DOMContentLoaded', () => {
 
             mediaRecorder.ondataavailable = (event) => { audioChunks.push(event.data); };
             mediaRecorder.onstop = async () => {
-                const audioBlob = new Blob(audioChunks, { type: 'audio/wav' });
-                // If we have a transcript, auto-send it
+                const audioBlob = new Blob(audioChunks, { type: mediaRecorder.mimeType || 'audio/webm' });
+                // If we have a transcript, auto-send it; otherwise let the server transcribe
                 const transcript = (finalTranscript || interimTranscript || '').trim();
                 if (transcript) {
                     userInput.value = transcript;
                     sendMessage();
+                } else if (audioBlob.size > 0) {
+                    transcribeOnServer(audioBlob);
                 }
                 voiceStatus.classList.add('hidden');
                 stopTimer();
@@ -0,0 +1,19 @@
+# text_utils.py
+"""
+Text normalization shared by the lookup code in CalmMateAI (emergency
+contacts by country/city, university resources and rosters by name).
+"""
+import re
+import unicodedata
+
+
+def normalize_name(name):
+    """
+    Normalize a place or institution name for lookups: accents stripped,
+    casefolded, dots and apostrophes dropped, other punctuation and whitespace
+    collapsed. "São Paulo " -> "sao paulo", "U.S.A." -> "usa", "N'Djamena" -> "ndjamena".
+    """
+    text = unicodedata.normalize('NFKD', name or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = re.sub(r"[.'’]", '', text)
+    return ' '.join(re.sub(r'[^\w]+', ' ', text).split())
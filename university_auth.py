@@ -1,63 +1,166 @@
 # university_auth.py
 
 import json
+import logging
 import os
+import threading
+import time
 
-# Define the paths to the data files
+from database import claim_roster_seed, get_student_password, roster_has_university
+from password_utils import check_password as verify_password
+from text_utils import normalize_name
+
+logger = logging.getLogger(__name__)
+
+# Define the paths to the data files (university_students.json only seeds an empty roster)
 UNIVERSITY_DATA_FILE = os.path.join(os.path.dirname(__file__), 'university_data.json')
 UNIVERSITY_STUDENTS_FILE = os.path.join(os.path.dirname(__file__), 'university_students.json')
 
-# Load the data once when the module is imported
-def load_university_data():
-    """Load university data from JSON files."""
-    try:
-        with open(UNIVERSITY_DATA_FILE, 'r') as f:
-            university_resources = json.load(f)
-        with open(UNIVERSITY_STUDENTS_FILE, 'r') as f:
-            university_students = json.load(f)
-        return university_resources, university_students
-    except FileNotFoundError as e:
-        print(f"Error: A university data file was not found. Please create {e.filename}")
-        return {}, {}
-
-# Load initial data
-UNIVERSITY_RESOURCES, UNIVERSITY_STUDENTS = load_university_data()
+# Seconds between checks of university_data.json for edits
+UNIVERSITY_DATA_CHECK_SECONDS = float(os.getenv("UNIVERSITY_DATA_CHECK_SECONDS", "2"))
 
-def authenticate_student(university_name, student_id, password):
+# Other common names, keyed by normalized alias.
+UNIVERSITY_ALIASES = {
+    'snu': 'Seoul National University',
+    'massachusetts institute of technology': 'MIT',
+    'berkeley': 'UC Berkeley',
+    'cal': 'UC Berkeley',
+    'university of california berkeley': 'UC Berkeley',
+    'uoft': 'University of Toronto',
+    'u of t': 'University of Toronto',
+}
+# Dropped to derive short names ("Stanford University" -> "stanford").
+_NAME_FILLER_WORDS = frozenset({'the', 'university', 'of'})
+
+class UniversityIndex:
+    """Resources by university, looked up by normalized name, short name or alias."""
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.names = {}
+        for name in resources:
+            self.names[normalize_name(name)] = name
+        for name in resources:
+            short = ' '.join(w for w in normalize_name(name).split() if w not in _NAME_FILLER_WORDS)
+            if short:
+                self.names.setdefault(short, name)
+        for alias, name in UNIVERSITY_ALIASES.items():
+            if name in resources:
+                self.names.setdefault(alias, name)
+
+    def get(self, university_name):
+        name = self.names.get(normalize_name(university_name))
+        return self.resources[name] if name else {}
+
+
+class _ResourcesCache:
+    """
+    university_data.json parsed into a UniversityIndex, re-parsed only when the
+    file's mtime/size changes. The file is stat'ed at most once every
+    UNIVERSITY_DATA_CHECK_SECONDS; an unreadable or invalid edit keeps the
+    previous data.
     """
-    Authenticates a student against the mock student data.
+
+    def __init__(self, path, check_seconds=UNIVERSITY_DATA_CHECK_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self.index = UniversityIndex({})
+        self.signature = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.check_seconds:
+            return self.index
+        with self.lock:
+            if self.checked_at is None or now - self.checked_at >= self.check_seconds:
+                self._refresh()
+                self.checked_at = now
+        return self.index
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        signature = (st.st_mtime_ns, st.st_size)
+        if signature == self.signature:
+            return
+        self.signature = signature
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                resources = json.load(f)
+            if not isinstance(resources, dict):
+                raise ValueError("top level must be an object of universities")
+        except (OSError, ValueError) as e:
+            logger.error("Keeping current university data; '%s' was rejected: %s", self.path, e)
+            return
+        self.index = UniversityIndex(resources)
+
+
+_resources_cache = _ResourcesCache(UNIVERSITY_DATA_FILE)
+
+
+def get_university_resources(university_name):
+    """
+    Retrieves resources for a given university.
+    The name matches regardless of case, accents and punctuation, and short
+    names and aliases work ("stanford", "SNU", "Berkeley").
     
     Args:
         university_name (str): The name of the university.
-        student_id (str): The student's ID.
-        password (str): The password.
         
     Returns:
-        tuple: (success (bool), message (str))
+        dict: A dictionary of resources. Returns an empty dict if not found.
     """
-    if university_name not in UNIVERSITY_STUDENTS:
-        return False, "University not found."
-    
-    students = UNIVERSITY_STUDENTS[university_name].get("students", {})
-    if student_id not in students:
-        return False, "Invalid Student ID."
-        
-    student_info = students[student_id]
-    if student_info['password'] == password:
-        return True, "Authentication successful."
-    else:
-        return False, "Invalid password."
+    return _resources_cache.get().get(university_name)
 
-def get_university_resources(university_name):
+
+def roster_key(university_name):
+    """The roster's key for a university: its canonical name (via aliases) normalized."""
+    name = _resources_cache.get().names.get(normalize_name(university_name), university_name)
+    return normalize_name(name)
+
+
+def seed_roster():
     """
-    Retrieves resources for a given university.
+    Seed an empty roster table from university_students.json (e.g. on a fresh
+    deploy). Called when the app starts, never on the login path; the database
+    makes sure only the first process to start does the hashing, and later
+    calls are a single query.
+
+    Returns:
+        int: Number of students imported (0 if another process claimed it or the roster had any).
+    """
+    if not os.path.exists(UNIVERSITY_STUDENTS_FILE) or not claim_roster_seed():
+        return 0
+    from roster_import import import_file
+    count = import_file(UNIVERSITY_STUDENTS_FILE)
+    logger.info("Seeded student roster from %s: %d students", UNIVERSITY_STUDENTS_FILE, count)
+    return count
+
+
+def authenticate_student(university_name, student_id, password):
+    """
+    Authenticates a student against the roster table (see roster_import.py).
     
     Args:
         university_name (str): The name of the university.
+        student_id (str): The student's ID.
+        password (str): The password.
         
     Returns:
-        dict: A dictionary of resources. Returns an empty dict if not found.
+        tuple: (success (bool), message (str))
     """
-    # Reload data to get latest changes
-    university_resources, _ = load_university_data()
-    return university_resources.get(university_name, {})
+    university = roster_key(university_name)
+    stored = get_student_password(university, student_id)
+    if stored is None:
+        if not roster_has_university(university):
+            return False, "University not found."
+        return False, "Invalid Student ID."
+    
+    if verify_password(stored, password):
+        return True, "Authentication successful."
+    else:
+        return False, "Invalid password."
@@ -0,0 +1,43 @@
+# user_cache.py
+"""
+Read-through cache of user profile records for CalmMateAI.
+
+Page views only need a user's display name, which with the Convex backend is
+a network round-trip per lookup. Records are cached per worker process with a
+size bound and TTL, and app.py invalidates an entry whenever that user is
+saved or updated. Password hashes are never cached.
+"""
+import os
+
+from ttl_cache import TTLCache
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+
+class UserCache:
+    """Profile records by email, loaded through the storage backend's get_user on a miss."""
+
+    def __init__(self, get_user, size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self._get_user = get_user
+        self._records = TTLCache(maxsize=size, ttl=ttl)
+
+    def get(self, email):
+        """Return { 'email': str, 'name': str } for a registered user, or None (misses aren't cached)."""
+        record = self._records.get(email)
+        if record is None:
+            user = self._get_user(email)
+            if user is None:
+                return None
+            record = {"email": user["email"], "name": user["name"]}
+            self._records.set(email, record)
+        return record
+
+    def get_name(self, email):
+        """Return display name for email, or 'User' if not found."""
+        record = self.get(email)
+        return record["name"] if record else "User"
+
+    def invalidate(self, email):
+        """Drop the cached record after the user is saved or updated."""
+        self._records.pop(email)
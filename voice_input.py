@@ -1,45 +1,118 @@
 # voice_input.py
+"""
+Speech-to-text for voice messages, done entirely in memory.
 
+Uploads are decoded straight from a file-like object or bytes, converted to
+16 kHz mono 16-bit PCM (what the recognizers expect) and handed over as
+speech_recognition.AudioData, so nothing is written to disk and concurrent
+requests can't clash. The recognition engine is chosen with VOICE_RECOGNIZER:
+
+    google          Google Web Speech API (default, online)
+    groq            Whisper on Groq (online; uses GROQ_API_KEY)
+    faster_whisper  local Whisper model (offline; pip install faster-whisper)
+    sphinx          CMU Sphinx (offline; pip install pocketsphinx)
+
+Further engines can be added with register_backend.
+"""
+import io
 import os
+
 import speech_recognition as sr
 from pydub import AudioSegment
 
-def recognize_speech_from_audio(audio_file_path):
+VOICE_RECOGNIZER = os.getenv("VOICE_RECOGNIZER", "google").lower()
+VOICE_LANGUAGE = os.getenv("VOICE_LANGUAGE", "en-US")
+# Model for the faster_whisper backend ("tiny", "base", "small", ...)
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # bytes, i.e. 16-bit PCM
+
+# name -> fn(recognizer, audio_data, language) -> text
+BACKENDS = {}
+
+
+def register_backend(name):
+    """Decorator registering a recognition backend under `name`."""
+    def decorator(fn):
+        BACKENDS[name] = fn
+        return fn
+    return decorator
+
+
+@register_backend("google")
+def _recognize_google(recognizer, audio_data, language):
+    return recognizer.recognize_google(audio_data, language=language)
+
+
+@register_backend("groq")
+def _recognize_groq(recognizer, audio_data, language):
+    return recognizer.recognize_groq(audio_data, language=language.split("-")[0])
+
+
+@register_backend("faster_whisper")
+def _recognize_faster_whisper(recognizer, audio_data, language):
+    return recognizer.recognize_faster_whisper(audio_data, model=WHISPER_MODEL, language=language.split("-")[0])
+
+
+@register_backend("sphinx")
+def _recognize_sphinx(recognizer, audio_data, language):
+    return recognizer.recognize_sphinx(audio_data, language=language)
+
+
+def load_audio(source, audio_format=None):
     """
-    Transcribes speech from an audio file using Google Web Speech API.
-    
+    Decode audio into AudioData at SAMPLE_RATE, mono, 16-bit, without temp files.
+
+    Args:
+        source: A file-like object (e.g. an upload stream), bytes, or a file path.
+        audio_format (str): Container format ("wav", "webm", "mp3", ...) if known;
+            pydub/ffmpeg detect it otherwise.
+
+    Returns:
+        speech_recognition.AudioData
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    segment = AudioSegment.from_file(source, format=audio_format)
+    segment = segment.set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(SAMPLE_WIDTH)
+    return sr.AudioData(segment.raw_data, SAMPLE_RATE, SAMPLE_WIDTH)
+
+
+def transcribe(source, audio_format=None, backend=None):
+    """
+    Like recognize_speech_from_audio, but raises instead of returning an error message.
+
+    Raises:
+        ValueError: Unknown backend.
+        speech_recognition.UnknownValueError: No intelligible speech.
+        speech_recognition.RequestError: The recognition service failed.
+        Exception: The audio could not be decoded.
+    """
+    name = backend or VOICE_RECOGNIZER
+    recognize = BACKENDS.get(name)
+    if recognize is None:
+        raise ValueError(f"unknown recognizer '{name}'")
+    return recognize(sr.Recognizer(), load_audio(source, audio_format), VOICE_LANGUAGE)
+
+
+def recognize_speech_from_audio(source, audio_format=None, backend=None):
+    """
+    Transcribes speech from an audio upload or file.
+
     Args:
-        audio_file_path (str): The file path to the audio file.
-    
+        source: A file-like object, bytes, or the file path to the audio file.
+        audio_format (str): Container format, if known.
+        backend (str): Recognition backend; defaults to VOICE_RECOGNIZER.
+
     Returns:
         str: The transcribed text, or an error message.
     """
-    r = sr.Recognizer()
-    
     try:
-        # Convert audio file to a format compatible with SpeechRecognition (e.g., WAV)
-        # This is important for handling various input formats like .mp3, .ogg, etc.
-        audio = AudioSegment.from_file(audio_file_path)
-        wav_audio_path = "temp_audio.wav"
-        audio.export(wav_audio_path, format="wav")
-
-        with sr.AudioFile(wav_audio_path) as source:
-            audio_data = r.record(source)  # Read the entire audio file
-            
-            # Use Google's Speech Recognition API
-            text = r.recognize_google(audio_data, language="en-US")
-            
-            # Clean up the temporary file
-            os.remove(wav_audio_path)
-            
-            return text
-            
+        return transcribe(source, audio_format, backend)
     except sr.UnknownValueError:
         return "Sorry, I could not understand the audio."
     except sr.RequestError as e:
-        return f"Could not request results from Google Speech Recognition service; {e}"
+        return f"Could not request results from the {backend or VOICE_RECOGNIZER} speech recognition service; {e}"
     except Exception as e:
         return f"An error occurred during speech recognition: {e}"
-
-# Note: The Flask app would need to save the uploaded audio file to a temporary location
-# before calling this function with the path to that temporary file.
@@ -0,0 +1,149 @@
+# voice_jobs.py
+"""
+Background transcription jobs for voice messages.
+
+The upload request only buffers the (size-limited) audio and enqueues a job;
+decoding and recognition run on a small per-process thread pool, so a long
+voice note doesn't hold a server thread for its whole transcription. At most
+VOICE_WORKERS jobs run at once and VOICE_MAX_PENDING more may wait; beyond
+that VoiceQueueFull is raised so the endpoint can answer 503.
+
+A job runs in the worker process that received the audio, but its status and
+result are stored in the SQLite database, so a status poll can be answered by
+any worker. Jobs, transcripts included, are deleted VOICE_JOB_TTL seconds
+after they were created.
+"""
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import speech_recognition as sr
+
+from database import get_voice_job, prune_voice_jobs, save_voice_job
+from voice_input import transcribe
+
+logger = logging.getLogger(__name__)
+
+VOICE_WORKERS = int(os.getenv("VOICE_WORKERS", "2"))
+VOICE_MAX_PENDING = int(os.getenv("VOICE_MAX_PENDING", "16"))
+VOICE_JOB_TTL = float(os.getenv("VOICE_JOB_TTL", "600"))
+
+# Job states
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class VoiceQueueFull(RuntimeError):
+    """Too many voice messages are already being transcribed or waiting."""
+
+
+class VoiceJob:
+    """One transcription; `then` may add fields (e.g. a chat reply) to the result."""
+
+    def __init__(self, owner, then=None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.then = then
+        self.status = QUEUED
+        self.result = {}
+        self.error = None
+        self.created = time.time()
+
+    def to_dict(self):
+        return job_dict(self.id, self.status, self.result, self.error)
+
+    def save(self):
+        save_voice_job(self.id, self.owner, self.status, json.dumps(self.result), self.error, self.created)
+
+
+def job_dict(job_id, status, result, error=None):
+    """A job as returned to clients: id, status, then transcript (and chat reply fields) or error."""
+    data = {'job_id': job_id, 'status': status, **result}
+    if error:
+        data['error'] = error
+    return data
+
+
+class VoiceJobQueue:
+    """Bounded transcription pool; job state lives in the database."""
+
+    def __init__(self, workers=VOICE_WORKERS, max_pending=VOICE_MAX_PENDING, job_ttl=VOICE_JOB_TTL):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self._executor = None
+        self._executor_pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        """One pool and admission semaphore per worker process (re-created after fork)."""
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="voice")
+                self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+                self._executor_pid = os.getpid()
+            return self._executor, self._slots
+
+    def submit(self, audio, audio_format=None, owner=None, then=None):
+        """
+        Queue a transcription and return its VoiceJob immediately.
+
+        Args:
+            audio (bytes): The uploaded audio.
+            audio_format (str): Container format, if known.
+            owner (str): Who may read the job (e.g. the session's conversation id).
+            then (callable): Optional fn(transcript) -> dict run on the worker after a
+                successful transcription; its fields are added to the job result.
+
+        Raises:
+            VoiceQueueFull: The pool and its queue are full.
+        """
+        executor, slots = self._get_executor()
+        if not slots.acquire(blocking=False):
+            raise VoiceQueueFull("Voice transcription is at capacity; try again shortly")
+        job = VoiceJob(owner, then)
+        try:
+            prune_voice_jobs(self.job_ttl)
+            job.save()
+            # Runs with the submitting request's context (e.g. its request id for logging)
+            future = executor.submit(contextvars.copy_context().run, self._run, job, audio, audio_format)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return job
+
+    def _run(self, job, audio, audio_format):
+        job.status = RUNNING
+        try:
+            job.save()
+            transcript = transcribe(audio, audio_format)
+            job.result = {'transcript': transcript}
+            if job.then is not None:
+                job.result.update(job.then(transcript))
+            job.status = DONE
+        except sr.UnknownValueError:
+            job.error = "Sorry, I could not understand the audio."
+            job.status = FAILED
+        except Exception as e:
+            logger.warning("Voice job %s failed: %s", job.id, e)
+            job.error = str(e) or type(e).__name__
+            job.status = FAILED
+        try:
+            job.save()
+        except sqlite3.Error as e:
+            # The poller sees the job as running until it expires
+            logger.error("Could not save voice job %s: %s", job.id, e)
+
+    def get(self, job_id, owner=None):
+        """Return the job as a dict (see job_dict) if it exists and belongs to `owner`, else None."""
+        row = get_voice_job(job_id, self.job_ttl)
+        if row is None or row['owner'] != owner:
+            return None
+        return job_dict(job_id, row['status'], json.loads(row['result']), row['error'])